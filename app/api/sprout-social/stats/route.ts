@@ -23,7 +23,7 @@ export async function POST(request: NextRequest) {
     const { startDate, endDate } = getQuarterDateRange(quarter)
 
     // Call the Python backend
-    const response = await fetch(`${backendUrl}/profile_stats`, {
+    const response = await fetch(`${backendUrl}/stats`, {
       method: "POST",
       headers: {
         "Content-Type": "application/json",
@@ -56,24 +56,17 @@ export async function POST(request: NextRequest) {
 
     const data = await response.json()
 
-    // Transform the backend response to match the frontend interface
+    // The backend already aggregates totals and the engagement rate in one pass
+    const totals = data.totals || {}
     const transformedData: QuarterStats = {
       quarter,
-      impressions: extractMetricValue(data, 'impressions'),
-      likes: extractMetricValue(data, 'likes'),
-      comments: extractMetricValue(data, 'comments_count'),
-      shares: extractMetricValue(data, 'shares_count'),
-      engagement_rate: 0, // Will be calculated below
+      impressions: totals.impressions || 0,
+      likes: totals.likes || 0,
+      comments: totals.comments_count || 0,
+      shares: totals.shares_count || 0,
+      engagement_rate: Math.round((data.engagement_rate || 0) * 100) / 100, // Round to 2 decimal places
     }
 
-    // Calculate engagement rate
-    transformedData.engagement_rate = calculateEngagementRate(
-      transformedData.likes,
-      transformedData.comments,
-      transformedData.shares,
-      transformedData.impressions
-    )
-
     return NextResponse.json(transformedData)
   } catch (error) {
     console.error("Backend API error:", error)
@@ -105,32 +98,3 @@ function getQuarterDateRange(quarter: string): { startDate: string; endDate: str
     endDate: quarterData.end,
   }
 }
-
-function extractMetricValue(data: any, metricName: string): number {
-  // Handle different possible data structures from the backend
-  if (typeof data === 'object' && data !== null) {
-    // If data has a 'data' property with an array
-    if (data.data && Array.isArray(data.data)) {
-      return data.data.reduce((sum: number, item: any) => {
-        const metrics = item.metrics || item
-        return sum + (metrics[metricName] || 0)
-      }, 0)
-    }
-
-    // If data has metrics directly
-    if (data.metrics) {
-      return data.metrics[metricName] || 0
-    }
-
-    // If the metric is directly on the data object
-    return data[metricName] || 0
-  }
-
-  return 0
-}
-
-function calculateEngagementRate(likes: number, comments: number, shares: number, impressions: number): number {
-  if (impressions === 0) return 0
-  const totalEngagement = likes + comments + shares
-  return Math.round(((totalEngagement / impressions) * 100) * 100) / 100 // Round to 2 decimal places
-}
@@ -122,121 +122,92 @@ export default function Dashboard() {
     fetchProfiles()
   }, [])
 
-  const fetchStats = async (profileId: string, dateRange: DateRange): Promise<PeriodStats> => {
-    if (!dateRange.from || !dateRange.to) {
-      throw new Error("Invalid date range")
-    }
-
-    const backendUrl = process.env.NEXT_PUBLIC_BACKEND_URL || "https://social-media-analytics-idnt.onrender.com"
-    const response = await fetch(`${backendUrl}/stats`, {
-      method: "POST",
-      headers: {
-        "Content-Type": "application/json",
-      },
-      body: JSON.stringify({
-        profile_id: profileId,
-        start_date: format(dateRange.from, "yyyy-MM-dd"),
-        end_date: format(dateRange.to, "yyyy-MM-dd"),
-      }),
-    })
-
-    if (!response.ok) {
-      const errorData = await response.json()
-      throw new Error(errorData.error || "Failed to fetch stats")
-    }
-
-    const data = await response.json()
-    const profile = profiles.find(p => p.id === profileId)
-
-    // Aggregate the daily data
-    const dailyData = data.data || []
-    const aggregatedStats = dailyData.reduce((acc: any, day: any) => {
-      const metrics = day.metrics || {}
-      return {
-        impressions: acc.impressions + (metrics.impressions || 0),
-        likes: acc.likes + (metrics.likes || 0),
-        comments: acc.comments + (metrics.comments_count || 0),
-        shares: acc.shares + (metrics.shares_count || 0),
-      }
-    }, { impressions: 0, likes: 0, comments: 0, shares: 0 })
-
-    // Calculate engagement rate
-    const totalEngagements = aggregatedStats.likes + aggregatedStats.comments + aggregatedStats.shares
-    const engagementRate = aggregatedStats.impressions > 0
-      ? parseFloat(((totalEngagements / aggregatedStats.impressions) * 100).toFixed(4))
-      : 0
-
+  const toPeriodStats = (summary: any, dateRange: DateRange): PeriodStats => {
+    const profile = profiles.find(p => p.id === summary.profile_id)
+    // The backend returns totals and the engagement rate already aggregated
+    const totals = summary.totals || {}
     return {
-      period: `${format(dateRange.from, "MMM d, yyyy")} - ${format(dateRange.to, "MMM d, yyyy")}`,
-      startDate: format(dateRange.from, "yyyy-MM-dd"),
-      endDate: format(dateRange.to, "yyyy-MM-dd"),
-      impressions: aggregatedStats.impressions,
-      likes: aggregatedStats.likes,
-      comments: aggregatedStats.comments,
-      shares: aggregatedStats.shares,
-      engagement_rate: engagementRate,
-      profileId,
-      profileName: profile?.name || `Profile ${profileId}`
+      period: `${format(dateRange.from!, "MMM d, yyyy")} - ${format(dateRange.to!, "MMM d, yyyy")}`,
+      startDate: summary.start_date,
+      endDate: summary.end_date,
+      impressions: totals.impressions || 0,
+      likes: totals.likes || 0,
+      comments: totals.comments_count || 0,
+      shares: totals.shares_count || 0,
+      engagement_rate: summary.engagement_rate || 0,
+      profileId: summary.profile_id,
+      profileName: profile?.name || `Profile ${summary.profile_id}`
     }
   }
 
-  const fetchStrategies = async (current: PeriodStats[], previous: PeriodStats[], customPrompt: string, okr: string) => {
-    const backendUrl = process.env.NEXT_PUBLIC_BACKEND_URL || "https://social-media-analytics-idnt.onrender.com"
-    const response = await fetch(`${backendUrl}/strategy`, {
-      method: "POST",
-      headers: {
-        "Content-Type": "application/json",
-      },
-      body: JSON.stringify({
-        report_data: {
-          profiles: current.map(stat => ({
-            ...stat,
-            previous: previous.find(p => p.profileId === stat.profileId)
-          })),
-          custom_prompt: customPrompt,
-          okr: okr
-        }
-      }),
-    })
-
-    if (!response.ok) {
-      const errorData = await response.json()
-      throw new Error(errorData.error || "Failed to fetch strategies")
-    }
-
-    const data = await response.json()
-    return data.strategies || []
-  }
-
   const handleAnalyze = async () => {
-    if (selectedProfiles.length === 0 || !currentPeriod || !previousPeriod) {
+    if (selectedProfiles.length === 0 || !currentPeriod?.from || !currentPeriod?.to || !previousPeriod?.from || !previousPeriod?.to) {
       setError("Please select at least one profile and both date ranges")
       return
     }
 
     setLoading(true)
     setError("")
+    setStrategies([])
 
     try {
-      // Fetch stats for all selected profiles
-      const currentStatsPromises = selectedProfiles.map(profileId => 
-        fetchStats(profileId, currentPeriod)
-      )
-      const previousStatsPromises = selectedProfiles.map(profileId => 
-        fetchStats(profileId, previousPeriod)
-      )
-
-      const [currentResults, previousResults] = await Promise.all([
-        Promise.all(currentStatsPromises),
-        Promise.all(previousStatsPromises)
-      ])
-
-      setAllCurrentStats(currentResults)
-      setAllPreviousStats(previousResults)
-
-      // Fetch AI strategies with custom prompt and OKR
-      const strategiesData = await fetchStrategies(currentResults, previousResults, customPrompt, okr)
-      setStrategies(strategiesData)
+      // One call fetches every profile's stats for both periods concurrently on the
+      // backend, then streams stats first and AI strategies once they are ready
+      const backendUrl = process.env.NEXT_PUBLIC_BACKEND_URL || "https://social-media-analytics-idnt.onrender.com"
+      const response = await fetch(`${backendUrl}/dashboard`, {
+        method: "POST",
+        headers: {
+          "Content-Type": "application/json",
+        },
+        body: JSON.stringify({
+          profile_ids: selectedProfiles,
+          current: {
+            start_date: format(currentPeriod.from, "yyyy-MM-dd"),
+            end_date: format(currentPeriod.to, "yyyy-MM-dd"),
+          },
+          previous: {
+            start_date: format(previousPeriod.from, "yyyy-MM-dd"),
+            end_date: format(previousPeriod.to, "yyyy-MM-dd"),
+          },
+          profile_names: Object.fromEntries(profiles.map(p => [p.id, p.name])),
+          custom_prompt: customPrompt,
+          okr: okr
+        }),
+      })
+
+      if (!response.ok || !response.body) {
+        const errorData = await response.json().catch(() => ({}))
+        throw new Error(errorData.detail || "Failed to load dashboard")
+      }
+
+      const reader = response.body.getReader()
+      const decoder = new TextDecoder()
+      let buffer = ""
+
+      const handleLine = (line: string) => {
+        if (!line.trim()) return
+        const message = JSON.parse(line)
+        if (message.type === "stats") {
+          setAllCurrentStats(message.current.map((summary: any) => toPeriodStats(summary, currentPeriod)))
+          setAllPreviousStats(message.previous.map((summary: any) => toPeriodStats(summary, previousPeriod)))
+          // Show stats right away; strategies fill in when their line arrives
+          setLoading(false)
+        } else if (message.type === "strategies") {
+          setStrategies(message.strategies || [])
+        } else if (message.type === "error") {
+          throw new Error(message.detail || "Failed to load dashboard")
+        }
+      }
+
+      while (true) {
+        const { done, value } = await reader.read()
+        if (done) break
+        buffer += decoder.decode(value, { stream: true })
+        const lines = buffer.split("\n")
+        buffer = lines.pop() || ""
+        lines.forEach(handleLine)
+      }
+      handleLine(buffer + decoder.decode())
     } catch (err) {
       setError(err instanceof Error ? err.message : "An error occurred")
     } finally {
@@ -0,0 +1,169 @@
+import numpy as np
+
+from tracer import traced
+
+# Metrics requested from the Sprout Social analytics/profiles endpoint
+PROFILE_METRICS = [
+    "impressions",
+    "likes",
+    "reactions",
+    "comments_count",
+    "shares_count"
+]
+
+
+# Metrics counted as engagements when computing the engagement rate
+ENGAGEMENT_METRICS = ["likes", "comments_count", "shares_count"]
+
+# Dimension key Sprout uses for the day of a daily analytics row
+DAY_DIMENSION = "reporting_period.by(day)"
+
+
+def engagement_rate(totals):
+    """Engagements as a percentage of impressions, rounded to 4 decimals"""
+    impressions = totals.get('impressions') or 0
+    if impressions <= 0:
+        return 0
+    engagements = sum(totals.get(metric) or 0 for metric in ENGAGEMENT_METRICS)
+    return round(engagements / impressions * 100, 4)
+
+
+@traced('aggregate.summarize_stats')
+def summarize_stats(stats, metrics=PROFILE_METRICS, include_daily=False):
+    """
+    Reduce a raw Sprout analytics payload (or a timeseries.MetricSeries) to
+    totals, engagement rate and, optionally, a columnar daily series,
+    walking the rows exactly once.
+    """
+    if stats is not None and not isinstance(stats, dict):
+        return _summarize_series(stats, metrics, include_daily)
+    rows = (stats.get('data') or []) if isinstance(stats, dict) else []
+    totals = dict.fromkeys(metrics, 0)
+    daily = {'dates': [], **{metric: [] for metric in metrics}} if include_daily else None
+
+    for row in rows:
+        row_metrics = row.get('metrics', row)
+        for metric in metrics:
+            value = row_metrics.get(metric) or 0
+            totals[metric] += value
+            if daily is not None:
+                daily[metric].append(value)
+        if daily is not None:
+            daily['dates'].append((row.get('dimensions') or {}).get(DAY_DIMENSION))
+
+    return _summarize(len(rows), totals, daily)
+
+
+def _summarize(days, totals, daily=None):
+    summary = {
+        'days': days,
+        'totals': totals,
+        'engagements': sum(totals.get(metric) or 0 for metric in ENGAGEMENT_METRICS),
+        'engagement_rate': engagement_rate(totals)
+    }
+    if daily is not None:
+        summary['daily'] = daily
+    return summary
+
+
+def _summarize_series(series, metrics, include_daily):
+    daily = None
+    if include_daily:
+        daily = {'dates': series.dates}
+        for metric in metrics:
+            column = series.columns.get(metric)
+            daily[metric] = column.tolist() if column is not None else [0] * len(series)
+    return _summarize(len(series), series.totals(metrics), daily)
+
+
+def iter_daily_rows(stats, metrics=PROFILE_METRICS):
+    """
+    Flatten Sprout analytics rows into {profile_id, date, metric...} dicts.
+    Rows without a day dimension are skipped, as MetricSeries.from_rows does,
+    so exports hold the same rows whether or not the series was cached.
+    """
+    rows = (stats.get('data') or []) if isinstance(stats, dict) else []
+    for row in rows:
+        dimensions = row.get('dimensions') or {}
+        day = dimensions.get(DAY_DIMENSION)
+        if day is None:
+            continue
+        row_metrics = row.get('metrics', row)
+        flat = {
+            'profile_id': dimensions.get('customer_profile_id'),
+            'date': day
+        }
+        for metric in metrics:
+            flat[metric] = row_metrics.get(metric) or 0
+        yield flat
+
+
+def build_metric_tensor(totals, n_profiles, n_periods, metrics=PROFILE_METRICS):
+    """Pack {(profile_index, period_index): {metric: value}} into an N x M x K array"""
+    tensor = np.zeros((n_profiles, n_periods, len(metrics)), dtype=np.float64)
+    for (profile_index, period_index), values in totals.items():
+        tensor[profile_index, period_index] = [values.get(metric) or 0 for metric in metrics]
+    return tensor
+
+
+def _to_list(array):
+    """Convert an array to nested lists, mapping NaN/inf to None for JSON"""
+    array = np.asarray(array, dtype=np.float64)
+    result = array.astype(object)
+    result[~np.isfinite(array)] = None
+    return result.tolist()
+
+
+@traced('aggregate.compare_periods')
+def compare_periods(tensor, profiles, periods, metrics=PROFILE_METRICS):
+    """
+    Compare an N-profile x M-period x K-metric tensor in one vectorized pass.
+
+    Returns period-over-period absolute and percent changes, the change of every
+    period against the first one, per-period profile ranks (1 = highest value,
+    ties share a rank) and the compound growth rate per period from the first to
+    the last period.
+    """
+    values = np.asarray(tensor, dtype=np.float64)
+    if values.shape != (len(profiles), len(periods), len(metrics)):
+        raise ValueError(
+            f"Tensor shape {values.shape} does not match "
+            f"{len(profiles)} profiles x {len(periods)} periods x {len(metrics)} metrics"
+        )
+
+    previous = values[:, :-1, :]
+    absolute_change = values[:, 1:, :] - previous
+    baseline = values[:, :1, :]
+    absolute_vs_first = values - baseline
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        percent_change = np.where(previous > 0, absolute_change / previous * 100, np.nan)
+        percent_vs_first = np.where(baseline > 0, absolute_vs_first / baseline * 100, np.nan)
+
+        steps = len(periods) - 1
+        first = values[:, 0, :]
+        last = values[:, -1, :]
+        if steps > 0:
+            growth_rate = np.where(
+                (first > 0) & (last >= 0),
+                (np.power(last / first, 1.0 / steps) - 1) * 100,
+                np.nan
+            )
+        else:
+            growth_rate = np.full(first.shape, np.nan)
+
+    # Competition ranking: 1 + number of profiles with a strictly higher value
+    ranks = (values[np.newaxis, :, :, :] > values[:, np.newaxis, :, :]).sum(axis=1) + 1
+
+    return {
+        'profiles': list(profiles),
+        'periods': list(periods),
+        'metrics': list(metrics),
+        'values': _to_list(values),
+        'absolute_change': _to_list(absolute_change),
+        'percent_change': _to_list(np.round(percent_change, 2)),
+        'absolute_change_vs_first': _to_list(absolute_vs_first),
+        'percent_change_vs_first': _to_list(np.round(percent_vs_first, 2)),
+        'ranks': ranks.tolist(),
+        'growth_rate': _to_list(np.round(growth_rate, 2))
+    }
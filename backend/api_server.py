@@ -1,10 +1,128 @@
-from fastapi import FastAPI, HTTPException
+import time
+_import_started = time.perf_counter()
+
+from fastapi import FastAPI, Header, HTTPException, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from main import get_profile_stats, compare_quarters, generate_strategy, list_profiles, get_customer_id
+from typing import Dict, List, Literal, Optional
+import main
+from main import (get_profile_stats, get_profile_stats_entry, peek_profile_stats_entry, get_range_totals,
+                  compare_quarters, generate_strategy, list_profiles, get_customer_id, open_stores, close_stores,
+                  readiness, iter_profile_stats_pages, get_http_session, close_http_session, drain_upstream,
+                  resolve_customer_id)
+from analytics import (PROFILE_METRICS, summarize_stats, build_metric_tensor, compare_periods,
+                       iter_daily_rows)
+from serialization import FastJSONResponse, json_response, dumps
+from middleware import (AdmissionControlMiddleware, AdmissionPolicy, CompressionMiddleware, MetricsMiddleware,
+                        ProfilingMiddleware, TracingMiddleware, admin_authorized, encoded_etag)
+from profiler import DEFAULT_INTERVAL, MAX_PROFILE_SECONDS, profile_for
+from instrumentation import REGISTRY
+from jobs import JobQueue, create_job_store
+from timeseries import MetricSeries, normalize_profile_id
+from cache import create_cache
+from logging_setup import configure_logging, get_logger
+from contextlib import asynccontextmanager
+import asyncio
+import csv
+import io
 import os
 
-app = FastAPI(title="Social Media Analytics API", version="1.0.0")
+# Seconds between sweeps of expired cache entries
+CACHE_PURGE_INTERVAL = float(os.environ.get("CACHE_PURGE_INTERVAL", 300))
+# Seconds shutdown waits, in total, for running jobs and in-flight Sprout/OpenAI requests before closing the pool
+SHUTDOWN_DRAIN_TIMEOUT = float(os.environ.get("SHUTDOWN_DRAIN_TIMEOUT", 25))
+# Upper bound on concurrent Sprout stats fetches made by one /dashboard request
+DASHBOARD_CONCURRENCY = int(os.environ.get("DASHBOARD_CONCURRENCY", 8))
+# Seconds finished jobs stay queryable through GET /jobs/{id}
+JOB_RETENTION = float(os.environ.get("JOB_RETENTION", 3600))
+# Token required by the /debug endpoints and per-request profiling; unset disables them
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
+# Seconds per-request profiles stay retrievable
+PROFILE_RETENTION = int(os.environ.get("PROFILE_RETENTION", 900))
+# Background job threads per worker process
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 4))
+
+# Admission control: cheap, usually cached stats requests come first and the
+# OpenAI-backed endpoints are shed as soon as stats requests start queueing.
+# Sync endpoints run in anyio's threadpool (40 threads by default), so keep the
+# two limits together under it. /compare and /dashboard instead fan out through
+# asyncio.to_thread, whose default executor has min(32, CPUs + 4) threads; those
+# fetches queue there, bounded per request by STATS_POLICY.limit and DASHBOARD_CONCURRENCY.
+ADMISSION_POLICIES = [
+    AdmissionPolicy(
+        "stats", ("/stats", "/profile_stats", "/compare", "/compare_quarters", "/export", "/profiles", "/customer"),
+        limit=int(os.environ.get("STATS_CONCURRENCY", 32)),
+        max_queue=int(os.environ.get("STATS_QUEUE", 64)),
+        max_wait=float(os.environ.get("ADMISSION_MAX_WAIT", 10)),
+        priority=0
+    ),
+    AdmissionPolicy(
+        "strategy", ("/strategy", "/generate_strategy", "/dashboard"),
+        limit=int(os.environ.get("STRATEGY_CONCURRENCY", 4)),
+        max_queue=int(os.environ.get("STRATEGY_QUEUE", 4)),
+        max_wait=float(os.environ.get("ADMISSION_MAX_WAIT", 10)),
+        priority=1
+    ),
+]
+STATS_POLICY = ADMISSION_POLICIES[0]
+
+configure_logging()
+logger = get_logger('api')
+
+async def purge_cache_periodically(job_queue):
+    while True:
+        await asyncio.sleep(CACHE_PURGE_INTERVAL)
+        try:
+            await asyncio.to_thread(main.stats_cache.purge_expired)
+            await asyncio.to_thread(job_queue.store.purge, time.time() - JOB_RETENTION)
+        except Exception:
+            logger.exception("Cache purge failed")
+
+def warm_up():
+    """Open the stores and HTTP pool and resolve the Sprout customer ID ahead of the first request"""
+    open_stores()
+    main.stats_cache.purge_expired()
+    get_http_session()
+    if readiness()["sprout_api_key"]:
+        try:
+            resolve_customer_id()
+        except Exception as e:
+            logger.warning("Warm-up could not resolve customer ID", extra={'error': str(e)})
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await asyncio.to_thread(warm_up)
+    # Per-process resources live on app.state, created here rather than at import
+    app.state.profile_store = create_cache('profiles', ttl=PROFILE_RETENTION)
+    job_queue = app.state.job_queue = JobQueue(create_job_store(), workers=JOB_WORKERS)
+    job_queue.register("stats", run_stats_job)
+    job_queue.register("strategy", run_strategy_job)
+    job_queue.start()
+    purge_task = asyncio.create_task(purge_cache_periodically(job_queue))
+    logger.info("API server ready", extra={'startup_seconds': round(time.perf_counter() - _import_started, 3)})
+    try:
+        yield
+    finally:
+        purge_task.cancel()
+        # One deadline for both steps, so the drain stays within SHUTDOWN_DRAIN_TIMEOUT
+        deadline = time.monotonic() + SHUTDOWN_DRAIN_TIMEOUT
+        await asyncio.to_thread(job_queue.shutdown, SHUTDOWN_DRAIN_TIMEOUT)
+        # Let upstream calls started by in-flight requests finish before tearing down
+        drained = await asyncio.to_thread(drain_upstream, max(0.0, deadline - time.monotonic()))
+        if not drained:
+            logger.warning("Shutdown drain timed out with upstream requests still in flight")
+        close_http_session()
+        close_stores()
+        app.state.profile_store.close()
+        job_queue.store.close()
+
+app = FastAPI(title="Social Media Analytics API", version="1.0.0",
+              default_response_class=FastJSONResponse, lifespan=lifespan)
+
+# Each middleware added wraps the ones added before it, so admission control runs
+# innermost: shed responses still get CORS headers and show up in metrics and traces
+app.add_middleware(AdmissionControlMiddleware, policies=ADMISSION_POLICIES)
 
 # Add CORS middleware
 app.add_middleware(
@@ -13,12 +131,51 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Profile-Id"],
 )
 
+# Compress responses above COMPRESSION_MIN_SIZE bytes (brotli when available, else gzip)
+app.add_middleware(CompressionMiddleware, minimum_size=int(os.environ.get("COMPRESSION_MIN_SIZE", 1024)))
+# Server span per request when TRACE_EXPORT_PATH is set; handler spans nest under it
+app.add_middleware(TracingMiddleware)
+app.add_middleware(ProfilingMiddleware, admin_token=ADMIN_TOKEN, get_store=lambda: app.state.profile_store)
+# Outermost, so latency includes compression
+app.add_middleware(MetricsMiddleware)
+
+# Clients must revalidate with If-None-Match, which is answered from the cache
+CACHE_CONTROL = "private, no-cache"
+
+# Content codings CompressionMiddleware may append to an ETag
+ETAG_CODINGS = ("gzip", "br")
+
+def matching_etag(request: Request, etag):
+    """
+    The If-None-Match tag that matches etag (weak comparison), either as is
+    or in one of its encoded forms, or None. A 304 must carry the tag of
+    the representation the client holds, so this is what gets sent back.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return None
+    if if_none_match.strip() == "*":
+        return etag
+    variants = {etag, *(encoded_etag(etag, coding) for coding in ETAG_CODINGS)}
+    for tag in if_none_match.split(","):
+        if tag.strip().removeprefix("W/") in variants:
+            return tag.strip().removeprefix("W/")
+    return None
+
+def not_modified(etag):
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+def stats_etag(version, variant):
+    return f'"{version}-{variant}"'
+
 class StatsRequest(BaseModel):
     profile_id: str
     start_date: str
     end_date: str
+    include_daily: bool = False
 
 class CompareRequest(BaseModel):
     stats_q1: dict
@@ -27,19 +184,69 @@ class CompareRequest(BaseModel):
 class StrategyRequest(BaseModel):
     report_data: dict
 
+class Period(BaseModel):
+    start_date: str
+    end_date: str
+    label: Optional[str] = None
+
+class StatsJobParams(BaseModel):
+    profile_ids: List[str]
+    periods: List[Period]
+    include_daily: bool = False
+
+class JobRequest(BaseModel):
+    type: str
+    params: dict
+
+class ExportRequest(BaseModel):
+    profile_ids: List[str]
+    start_date: str
+    end_date: str
+    format: Literal["ndjson", "csv"] = "ndjson"
+
+class DashboardRequest(BaseModel):
+    profile_ids: List[str]
+    current: Period
+    previous: Period
+    profile_names: Dict[str, str] = {}
+    custom_prompt: str = ""
+    okr: str = ""
+
+class MultiCompareRequest(BaseModel):
+    profile_ids: List[str]
+    periods: List[Period]
+    metrics: Optional[List[str]] = None
+
 @app.get("/")
 def read_root():
     return {"message": "Social Media Analytics API", "status": "running"}
 
 @app.get("/health")
 def health_check():
+    """Liveness: the process is up and serving requests"""
     return {"status": "healthy"}
 
+@app.get("/ready")
+def readiness_check():
+    """Readiness: upstream credentials are configured, so requests can be served"""
+    checks = readiness()
+    ready = all(checks.values())
+    return json_response({
+        "status": "ready" if ready else "not_ready",
+        "checks": checks,
+        "startup_seconds": round(STARTUP_SECONDS, 4)
+    }, status_code=200 if ready else 503)
+
+@app.get("/metrics")
+def metrics_endpoint():
+    """Prometheus text exposition of this worker's request, upstream, cache and token metrics"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/profiles")
 def get_profiles():
     """Get list of available profiles"""
     try:
-        return list_profiles()
+        return json_response(list_profiles())
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -53,45 +260,103 @@ def get_customer():
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.post("/profile_stats")
-def profile_stats(req: StatsRequest):
+def profile_stats(req: StatsRequest, request: Request):
+    cached = peek_profile_stats_entry(req.profile_id, req.start_date, req.end_date)
+    matched = matching_etag(request, cached.etag) if cached is not None else None
+    if matched:
+        return not_modified(matched)
     try:
-        return get_profile_stats(req.profile_id, req.start_date, req.end_date)
+        entry = get_profile_stats_entry(req.profile_id, req.start_date, req.end_date)
+        payload = MetricSeries.from_dict(entry.value).to_payload()
+        return json_response(payload, headers={"ETag": entry.etag, "Cache-Control": CACHE_CONTROL})
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.post("/compare_quarters")
 def compare_quarters_endpoint(req: CompareRequest):
     try:
-        return compare_quarters(req.stats_q1, req.stats_q2)
+        return json_response(compare_quarters(req.stats_q1, req.stats_q2))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/compare")
+async def compare_endpoint(req: MultiCompareRequest):
+    """
+    Compare any number of profiles across any number of periods.
+    Periods are compared in the order given, so pass them oldest first.
+    """
+    if not req.profile_ids or not req.periods:
+        raise HTTPException(status_code=400, detail="At least one profile and one period are required")
+    metrics = req.metrics or PROFILE_METRICS
+    unknown = [metric for metric in metrics if metric not in PROFILE_METRICS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown metrics {unknown}, expected some of {PROFILE_METRICS}")
+    # Cold pairs are fetched concurrently, at most as many at once as the stats admission limit
+    limiter = asyncio.Semaphore(STATS_POLICY.limit)
+
+    async def fetch(profile_id, period):
+        async with limiter:
+            _, totals = await asyncio.to_thread(get_range_totals, profile_id, period.start_date, period.end_date,
+                                                metrics)
+        return totals
+
+    try:
+        pairs = [(profile_index, period_index)
+                 for profile_index in range(len(req.profile_ids)) for period_index in range(len(req.periods))]
+        results = await asyncio.gather(*[
+            fetch(req.profile_ids[profile_index], req.periods[period_index]) for profile_index, period_index in pairs
+        ])
+        totals = dict(zip(pairs, results))
+
+        tensor = build_metric_tensor(totals, len(req.profile_ids), len(req.periods), metrics)
+        labels = [period.label or f"{period.start_date}...{period.end_date}" for period in req.periods]
+        return json_response(compare_periods(tensor, req.profile_ids, labels, metrics))
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.post("/generate_strategy")
 def generate_strategy_endpoint(req: StrategyRequest):
     try:
-        strategy_json_string = generate_strategy(req.report_data)
-        # Parse the JSON string returned by generate_strategy and return the object
-        import json
-        return json.loads(strategy_json_string)
+        return json_response(generate_strategy(req.report_data))
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-@app.post("/stats")
-def stats_endpoint(req: StatsRequest):
+def stats_response(request: Request, profile_id, start_date, end_date, include_daily):
     """
-    New endpoint that matches frontend expectations.
-    This is a wrapper around the existing profile_stats function.
+    Normalized per-period summary for the frontend: totals per metric,
+    engagements and engagement rate, plus the daily series when
+    include_daily is set. Use /profile_stats for Sprout's raw payload.
+
+    Responses carry a strong ETag derived from the cached data version (with
+    the content coding appended when compressed), so a matching
+    If-None-Match is answered with 304 before any work is done.
     """
+    variant = "daily" if include_daily else "summary"
+    cached = peek_profile_stats_entry(profile_id, start_date, end_date)
+    matched = matching_etag(request, stats_etag(cached.version, variant)) if cached is not None else None
+    if matched:
+        return not_modified(matched)
     try:
-        # Call the existing profile_stats function
-        raw_data = get_profile_stats(req.profile_id, req.start_date, req.end_date)
-
-        # Transform the data to match frontend expectations
-        # The frontend expects a response that can be used directly
-        return raw_data
+        entry = get_profile_stats_entry(profile_id, start_date, end_date)
+        summary = summarize_stats(MetricSeries.from_dict(entry.value), include_daily=include_daily)
+        return json_response({
+            'profile_id': profile_id,
+            'start_date': start_date,
+            'end_date': end_date,
+            **summary
+        }, headers={"ETag": stats_etag(entry.version, variant), "Cache-Control": CACHE_CONTROL})
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@app.get("/stats")
+def stats_get_endpoint(request: Request, profile_id: str, start_date: str, end_date: str, include_daily: bool = False):
+    """Conditional-GET variant of /stats for browser and proxy caching"""
+    return stats_response(request, profile_id, start_date, end_date, include_daily)
+
+@app.post("/stats")
+def stats_endpoint(req: StatsRequest, request: Request):
+    return stats_response(request, req.profile_id, req.start_date, req.end_date, req.include_daily)
+
 @app.post("/strategy")
 def strategy_endpoint(req: StrategyRequest):
     """
@@ -99,15 +364,258 @@ def strategy_endpoint(req: StrategyRequest):
     This is a wrapper around the existing generate_strategy function.
     """
     try:
-        strategy_json_string = generate_strategy(req.report_data)
-        # Parse the JSON string returned by generate_strategy and return the object
-        import json
-        return json.loads(strategy_json_string)
+        return json_response(generate_strategy(req.report_data))
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+def strategy_profile_stats(summary, profile_name):
+    """Per-profile stats in the shape the dashboard sends to /strategy"""
+    totals = summary['totals']
+    return {
+        'period': summary['label'] or f"{summary['start_date']} - {summary['end_date']}",
+        'startDate': summary['start_date'],
+        'endDate': summary['end_date'],
+        'impressions': totals['impressions'],
+        'likes': totals['likes'],
+        'comments': totals['comments_count'],
+        'shares': totals['shares_count'],
+        'engagement_rate': summary['engagement_rate'],
+        'profileId': summary['profile_id'],
+        'profileName': profile_name
+    }
+
+async def dashboard_stream(req: DashboardRequest):
+    """
+    NDJSON stream for the dashboard: a "stats" line (both periods for every
+    profile plus their comparison) as soon as all stats are in, then a
+    "strategies" line once OpenAI answers. Errors end the stream with an
+    "error" line.
+    """
+    periods = [req.previous, req.current]
+    limiter = asyncio.Semaphore(DASHBOARD_CONCURRENCY)
+
+    async def fetch(profile_id, period):
+        async with limiter:
+            series = await asyncio.to_thread(get_profile_stats, profile_id, period.start_date, period.end_date)
+        return {
+            'profile_id': profile_id,
+            'start_date': period.start_date,
+            'end_date': period.end_date,
+            'label': period.label,
+            **summarize_stats(series)
+        }
+
+    try:
+        summaries = await asyncio.gather(*[
+            fetch(profile_id, period) for profile_id in req.profile_ids for period in periods
+        ])
+    except Exception as e:
+        logger.warning("Dashboard stream failed", extra={'stage': 'stats', 'error': str(e)})
+        yield dumps({'type': 'error', 'stage': 'stats', 'detail': str(e)}) + b"\n"
+        return
+
+    previous = summaries[0::2]
+    current = summaries[1::2]
+    totals = {(index // 2, index % 2): summary['totals'] for index, summary in enumerate(summaries)}
+    tensor = build_metric_tensor(totals, len(req.profile_ids), len(periods))
+    labels = [period.label or f"{period.start_date}...{period.end_date}" for period in periods]
+    yield dumps({
+        'type': 'stats',
+        'current': current,
+        'previous': previous,
+        'comparison': compare_periods(tensor, req.profile_ids, labels)
+    }) + b"\n"
+
+    report_data = {
+        'profiles': [
+            {
+                **strategy_profile_stats(current_summary, req.profile_names.get(profile_id, f"Profile {profile_id}")),
+                'previous': strategy_profile_stats(previous_summary, req.profile_names.get(profile_id, f"Profile {profile_id}"))
+            }
+            for profile_id, current_summary, previous_summary in zip(req.profile_ids, current, previous)
+        ],
+        'custom_prompt': req.custom_prompt,
+        'okr': req.okr
+    }
+    try:
+        strategies = await asyncio.to_thread(generate_strategy, report_data)
+    except Exception as e:
+        logger.warning("Dashboard stream failed", extra={'stage': 'strategies', 'error': str(e)})
+        yield dumps({'type': 'error', 'stage': 'strategies', 'detail': str(e)}) + b"\n"
+        return
+    yield dumps({'type': 'strategies', **strategies}) + b"\n"
+
+@app.post("/dashboard")
+def dashboard_endpoint(req: DashboardRequest):
+    """
+    Everything the dashboard needs in one call: stats for every profile in
+    both periods (fetched concurrently), their comparison and AI strategies,
+    streamed as newline-delimited JSON so stats render before strategies.
+    """
+    if not req.profile_ids:
+        raise HTTPException(status_code=400, detail="At least one profile is required")
+    return StreamingResponse(dashboard_stream(req), media_type="application/x-ndjson")
+
+EXPORT_COLUMNS = ["profile_id", "date"] + PROFILE_METRICS
+
+def iter_export_pages(profile_id, start_date, end_date):
+    """Daily rows for one profile, one Sprout page at a time (or all at once when cached)"""
+    cached = peek_profile_stats_entry(profile_id, start_date, end_date)
+    if cached is not None:
+        pages = [MetricSeries.from_dict(cached.value).to_payload()]
+    else:
+        pages = iter_profile_stats_pages(profile_id, start_date, end_date)
+    for page in pages:
+        rows = list(iter_daily_rows(page))
+        for row in rows:
+            # Rows without a customer_profile_id still belong to the requested profile
+            if row['profile_id'] is None:
+                row['profile_id'] = normalize_profile_id(profile_id)
+        yield rows
+
+# First field of the CSV row that marks an export cut short by an upstream error
+EXPORT_CSV_ERROR_MARKER = "#error"
+
+def iter_export(req: ExportRequest):
+    """
+    Pages of rows for every requested profile. If Sprout fails mid-stream the
+    200 status is already sent, so the failure is yielded as a final
+    (profile_id, None, detail) item for the writer to mark in the body.
+    """
+    for profile_id in req.profile_ids:
+        try:
+            for rows in iter_export_pages(profile_id, req.start_date, req.end_date):
+                yield profile_id, rows, None
+        except Exception as e:
+            logger.warning("Export failed", extra={'profile_id': profile_id, 'error': str(e)})
+            yield profile_id, None, str(e)
+            return
+
+def export_ndjson(req: ExportRequest):
+    for profile_id, rows, error in iter_export(req):
+        if error is not None:
+            yield dumps({'type': 'error', 'profile_id': profile_id, 'detail': error}) + b"\n"
+        elif rows:
+            yield b"".join(dumps(row) + b"\n" for row in rows)
+
+def export_csv(req: ExportRequest):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+    writer.writeheader()
+    for profile_id, rows, error in iter_export(req):
+        if error is not None:
+            csv.writer(buffer).writerow([EXPORT_CSV_ERROR_MARKER, profile_id, error])
+        else:
+            writer.writerows(rows)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+
+@app.post("/export")
+def export_endpoint(req: ExportRequest):
+    """
+    Stream daily metrics for many profiles as NDJSON or CSV. Rows are written
+    page by page as Sprout returns them, so memory stays flat however long
+    the date range is. If Sprout fails part way, the body ends with an
+    {"type": "error"} record (NDJSON) or a "#error,<profile_id>,<detail>" row
+    (CSV) instead of just stopping.
+    """
+    if not req.profile_ids:
+        raise HTTPException(status_code=400, detail="At least one profile is required")
+    filename = f"export_{req.start_date}_{req.end_date}.{req.format}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    if req.format == "csv":
+        return StreamingResponse(export_csv(req), media_type="text/csv", headers=headers)
+    return StreamingResponse(export_ndjson(req), media_type="application/x-ndjson", headers=headers)
+
+def run_stats_job(params, progress):
+    """Summaries for every profile x period pair, reporting progress as each one lands"""
+    job = StatsJobParams(**params)
+    pairs = [(profile_id, period) for profile_id in job.profile_ids for period in job.periods]
+    stats = []
+    progress(0, len(pairs))
+    for done, (profile_id, period) in enumerate(pairs, start=1):
+        series = get_profile_stats(profile_id, period.start_date, period.end_date)
+        stats.append({
+            'profile_id': profile_id,
+            'start_date': period.start_date,
+            'end_date': period.end_date,
+            'label': period.label,
+            **summarize_stats(series, include_daily=job.include_daily)
+        })
+        progress(done, len(pairs))
+    return {'stats': stats}
+
+def run_strategy_job(params, progress):
+    progress(0, 1)
+    result = generate_strategy(params.get('report_data', {}))
+    progress(1, 1)
+    return result
+
+@app.post("/jobs", status_code=202)
+def create_job(req: JobRequest, request: Request):
+    """
+    Enqueue a long-running "stats" or "strategy" job and return at once.
+    Poll GET /jobs/{id} for progress and the result.
+    """
+    job_queue = request.app.state.job_queue
+    if req.type not in job_queue.job_types:
+        raise HTTPException(status_code=400, detail=f"Unknown job type '{req.type}', expected one of {job_queue.job_types}")
+    job = job_queue.submit(req.type, req.params)
+    return json_response(job, status_code=202, headers={"Location": f"/jobs/{job['id']}"})
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str, request: Request):
+    job = request.app.state.job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return json_response(job)
+
+def require_admin(token):
+    # 404 rather than 401/403, so the debug endpoints are invisible without a token
+    if not admin_authorized(ADMIN_TOKEN, token):
+        raise HTTPException(status_code=404, detail="Not Found")
+
+@app.get("/debug/profile")
+async def profile_process(seconds: float = 10, interval: float = DEFAULT_INTERVAL, include_idle: bool = False,
+                          x_admin_token: Optional[str] = Header(None)):
+    """
+    Sample every thread of this worker for the given number of seconds and
+    return collapsed stacks ("frame;frame;frame count" per line) for
+    flamegraph.pl or speedscope.
+    """
+    require_admin(x_admin_token)
+    if not 0 < seconds <= MAX_PROFILE_SECONDS or not 0.001 <= interval <= 1:
+        raise HTTPException(status_code=400, detail=f"seconds must be in (0, {MAX_PROFILE_SECONDS}] and interval in [0.001, 1]")
+    sampler = await asyncio.to_thread(profile_for, seconds, interval, include_idle)
+    return PlainTextResponse(sampler.collapsed(), headers={"X-Profile-Samples": str(sampler.sample_count)})
+
+@app.get("/debug/profiles/{profile_id}")
+def get_request_profile(profile_id: str, request: Request, x_admin_token: Optional[str] = Header(None)):
+    """Collapsed stacks recorded for a request sent with X-Profile: 1"""
+    require_admin(x_admin_token)
+    entry = request.app.state.profile_store.get(f"profile:{profile_id}")
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    profile = entry.value
+    return PlainTextResponse(profile["collapsed"], headers={
+        "X-Profile-Samples": str(profile["samples"]),
+        "X-Profile-Duration": str(profile["duration"])
+    })
+
+# Time spent importing this module and its dependencies
+STARTUP_SECONDS = time.perf_counter() - _import_started
+
 if __name__ == "__main__":
     import uvicorn
+    logger.info("API server initialized", extra={'startup_seconds': round(STARTUP_SECONDS, 3)})
     port = int(os.environ.get("PORT", 8000))
     host = os.environ.get("HOST", "0.0.0.0")
-    uvicorn.run(app, host=host, port=port, reload=False)
\ No newline at end of file
+    # WEB_CONCURRENCY > 1 starts that many worker processes; they share the
+    # stats cache through SQLite unless CACHE_BACKEND says otherwise
+    workers = int(os.environ.get("WEB_CONCURRENCY", 1))
+    if workers > 1:
+        uvicorn.run("api_server:app", host=host, port=port, workers=workers, reload=False,
+                    timeout_graceful_shutdown=SHUTDOWN_DRAIN_TIMEOUT)
+    else:
+        uvicorn.run(app, host=host, port=port, reload=False, timeout_graceful_shutdown=SHUTDOWN_DRAIN_TIMEOUT)
\ No newline at end of file
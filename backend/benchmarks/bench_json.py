@@ -0,0 +1,66 @@
+"""
+Compare per-request CPU time of the old JSON response path against the
+single-pass orjson path used by api_server.
+
+Run from the backend directory:
+    python -m benchmarks.bench_json [--profiles 50] [--days 365] [--repeat 20]
+"""
+import argparse
+import json
+import time
+
+from fastapi.encoders import jsonable_encoder
+
+from benchmarks.synthetic import make_stats_payload
+from main import generate_fallback_strategies
+from serialization import dumps
+
+
+def starlette_dumps(content):
+    """What Starlette's JSONResponse.render does"""
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def old_stats_path(payload):
+    return starlette_dumps(jsonable_encoder(payload))
+
+
+def old_strategy_path(strategies):
+    # generate_strategy used to return an indented string that the endpoint parsed back
+    text = json.dumps(strategies, indent=2)
+    return starlette_dumps(jsonable_encoder(json.loads(text)))
+
+
+def cpu_time_per_call(func, arg, repeat):
+    func(arg)
+    start = time.process_time()
+    for _ in range(repeat):
+        func(arg)
+    return (time.process_time() - start) / repeat
+
+
+def report(name, old, new):
+    saved = (old - new) / old * 100 if old else 0
+    print(f"{name:<32} old {old * 1000:9.3f} ms   new {new * 1000:9.3f} ms   saved {saved:5.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--profiles', type=int, default=50)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    payload = make_stats_payload(args.profiles, args.days)
+    strategies = generate_fallback_strategies({})
+    assert json.loads(dumps(payload)) == json.loads(old_stats_path(payload))
+
+    print(f"Stats payload: {args.profiles} profiles x {args.days} days, {len(dumps(payload)) / 1e6:.1f} MB")
+    report("stats response", cpu_time_per_call(old_stats_path, payload, args.repeat),
+           cpu_time_per_call(dumps, payload, args.repeat))
+    report("strategy response", cpu_time_per_call(old_strategy_path, strategies, args.repeat * 50),
+           cpu_time_per_call(dumps, strategies, args.repeat * 50))
+
+
+if __name__ == "__main__":
+    main()
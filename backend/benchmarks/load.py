@@ -0,0 +1,168 @@
+"""
+End-to-end load test: starts the stub Sprout and OpenAI servers, runs
+api_server in a subprocess pointed at them, drives an endpoint at a fixed
+concurrency and reports latency percentiles and throughput.
+
+Run from the backend directory:
+    python -m benchmarks.load [--endpoint stats] [--concurrency 16] [--requests 500]
+        [--days 90] [--distinct 50] [--sprout-latency 0.05] [--workers 1]
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+import requests
+
+from benchmarks.stubs import OpenAIStub, SproutStub
+from benchmarks.synthetic import FIRST_PROFILE_ID
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return float('nan')
+    index = min(len(sorted_values) - 1, max(0, round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def start_api_server(port, sprout_url, openai_url, workers, extra_env=None):
+    """Run api_server.py in a subprocess and wait for /health"""
+    env = dict(os.environ,
+               PORT=str(port), HOST='127.0.0.1', WEB_CONCURRENCY=str(workers),
+               SPROUT_BASE_URL=sprout_url, OPENAI_BASE_URL=openai_url,
+               SPROUT_API_KEY='stub-sprout-key', OPENAI_API_KEY='stub-openai-key',
+               LOG_LEVEL='WARNING', **(extra_env or {}))
+    process = subprocess.Popen([sys.executable, 'api_server.py'], env=env)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            if requests.get(f'http://127.0.0.1:{port}/ready', timeout=1).status_code == 200:
+                return process
+        except requests.ConnectionError:
+            pass
+        if process.poll() is not None:
+            raise RuntimeError(f"api_server exited with code {process.returncode}")
+        time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("api_server did not become ready within 30s")
+
+
+def make_request_factory(endpoint, base_url, days, distinct):
+    """Return call(session, index) issuing one request against endpoint"""
+    end = date(2025, 6, 30)
+    start = end - timedelta(days=days - 1)
+
+    def stats(session, index):
+        return session.get(f'{base_url}/stats', params={
+            'profile_id': str(FIRST_PROFILE_ID + index % distinct),
+            'start_date': start.isoformat(),
+            'end_date': end.isoformat()
+        })
+
+    def profiles(session, index):
+        return session.get(f'{base_url}/profiles')
+
+    def strategy(session, index):
+        return session.post(f'{base_url}/strategy', json={'report_data': {'profiles': [{
+            'profileName': f'Profile {index % distinct}',
+            'impressions': 12000, 'engagements': 640, 'engagementRate': 5.3
+        }]}})
+
+    return {'stats': stats, 'profiles': profiles, 'strategy': strategy}[endpoint]
+
+
+def run_load(call, concurrency, total):
+    """Issue total requests from concurrency threads; returns (latencies, statuses, elapsed)"""
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    counter = iter(range(total))
+    local = threading.local()
+
+    def worker():
+        session = local.session = getattr(local, 'session', None) or requests.Session()
+        while True:
+            with lock:
+                index = next(counter, None)
+            if index is None:
+                return
+            started = time.perf_counter()
+            try:
+                status = call(session, index).status_code
+            except requests.RequestException:
+                status = 'error'
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for _ in range(concurrency):
+            executor.submit(worker)
+    return sorted(latencies), statuses, time.perf_counter() - started
+
+
+def report(endpoint, concurrency, latencies, statuses, elapsed):
+    ms = lambda value: f"{value * 1000:8.1f} ms"
+    print(f"{endpoint}: {len(latencies)} requests at concurrency {concurrency} in {elapsed:.2f}s")
+    print(f"  throughput {len(latencies) / elapsed:8.1f} req/s")
+    print(f"  p50 {ms(percentile(latencies, 0.50))}   p95 {ms(percentile(latencies, 0.95))}   "
+          f"p99 {ms(percentile(latencies, 0.99))}   max {ms(latencies[-1] if latencies else float('nan'))}")
+    print(f"  status codes {dict(sorted(statuses.items(), key=str))}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--endpoint', choices=['stats', 'profiles', 'strategy'], default='stats')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--warmup', type=int, default=20, help='requests sent before measuring')
+    parser.add_argument('--days', type=int, default=90, help='date range length for /stats')
+    parser.add_argument('--distinct', type=int, default=50,
+                        help='distinct profiles requested; fewer means more stats cache hits')
+    parser.add_argument('--profiles', type=int, default=50, help='profiles the Sprout stub lists')
+    parser.add_argument('--seed', type=int, default=0, help='synthetic dataset seed')
+    parser.add_argument('--page-size', type=int, default=100, help='daily rows per Sprout analytics page')
+    parser.add_argument('--sprout-latency', type=float, default=0.05)
+    parser.add_argument('--openai-latency', type=float, default=0.5)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of upstream requests that fail')
+    parser.add_argument('--workers', type=int, default=1, help='API server worker processes')
+    args = parser.parse_args()
+
+    sprout = SproutStub(latency=args.sprout_latency, error_rate=args.error_rate,
+                        page_size=args.page_size, profiles=args.profiles, seed=args.seed).start()
+    openai = OpenAIStub(latency=args.openai_latency, error_rate=args.error_rate).start()
+    port = free_port()
+    # Raise the admission limits so the benchmark measures the server, not the shedding
+    server = start_api_server(port, sprout.url, openai.url, args.workers, {
+        'STATS_CONCURRENCY': str(max(32, args.concurrency)), 'STATS_QUEUE': str(args.concurrency * 4),
+        'STRATEGY_CONCURRENCY': str(max(4, args.concurrency)), 'STRATEGY_QUEUE': str(args.concurrency * 4),
+        'CACHE_BACKEND': 'memory' if args.workers == 1 else 'sqlite'
+    })
+    try:
+        call = make_request_factory(args.endpoint, f'http://127.0.0.1:{port}', args.days, args.distinct)
+        run_load(call, min(args.concurrency, max(args.warmup, 1)), args.warmup)
+        latencies, statuses, elapsed = run_load(call, args.concurrency, args.requests)
+        report(args.endpoint, args.concurrency, latencies, statuses, elapsed)
+        print(f"  upstream requests: sprout {sprout.requests}, openai {openai.requests}")
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+        sprout.stop()
+        openai.stop()
+
+
+if __name__ == "__main__":
+    main()
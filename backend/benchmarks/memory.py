@@ -0,0 +1,197 @@
+"""
+Memory per request as stats payloads grow. Every case runs in a fresh
+interpreter against the stub Sprout server: the endpoint is called once to
+measure the rise in peak RSS, then again under tracemalloc to find the
+allocation sites holding the most memory at the traced peak.
+
+Run from the backend directory:
+    python -m benchmarks.memory [--endpoints stats profile_stats compare export]
+        [--profiles 1 10] [--days 90 365 730] [--top 5] [--json results.json]
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import threading
+import tracemalloc
+from datetime import date, timedelta
+
+from benchmarks.stubs import SproutStub
+from benchmarks.synthetic import FIRST_PROFILE_ID
+
+ENDPOINTS = ('stats', 'profile_stats', 'compare', 'export')
+# How often the tracemalloc sampler looks for a new peak
+SNAPSHOT_INTERVAL = 0.02
+
+
+def peak_rss_bytes():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def short_path(filename):
+    """Path relative to the backend directory, or package/module for library code"""
+    relative = os.path.relpath(filename)
+    if not relative.startswith('..'):
+        return relative
+    return os.path.join(os.path.basename(os.path.dirname(filename)), os.path.basename(filename))
+
+
+def build_request(endpoint, profiles, days, end=date(2024, 12, 31)):
+    """(method, path, kwargs) for one call covering profiles x days of data"""
+    start = (end - timedelta(days=days - 1)).isoformat()
+    profile_ids = [str(FIRST_PROFILE_ID + index) for index in range(profiles)]
+    if endpoint == 'stats':
+        return 'GET', '/stats', {'params': {'profile_id': profile_ids[0], 'start_date': start,
+                                            'end_date': end.isoformat(), 'include_daily': True}}
+    if endpoint == 'profile_stats':
+        return 'POST', '/profile_stats', {'json': {'profile_id': profile_ids[0], 'start_date': start,
+                                                   'end_date': end.isoformat()}}
+    if endpoint == 'compare':
+        middle = (end - timedelta(days=days // 2)).isoformat()
+        return 'POST', '/compare', {'json': {'profile_ids': profile_ids, 'periods': [
+            {'start_date': start, 'end_date': middle}, {'start_date': middle, 'end_date': end.isoformat()}]}}
+    if endpoint == 'export':
+        return 'POST', '/export', {'json': {'profile_ids': profile_ids, 'start_date': start,
+                                            'end_date': end.isoformat()}}
+    raise ValueError(f"Unknown endpoint: {endpoint}")
+
+
+class PeakSnapshotter:
+    """Keeps the tracemalloc snapshot with the most traced memory seen while running"""
+
+    def __init__(self):
+        self.snapshot = None
+        self._size = -1
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _take(self):
+        current, _ = tracemalloc.get_traced_memory()
+        if current > self._size:
+            self._size = current
+            self.snapshot = tracemalloc.take_snapshot()
+
+    def _run(self):
+        while not self._stop.wait(SNAPSHOT_INTERVAL):
+            self._take()
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._take()
+
+
+def measure_case(endpoint, profiles, days, top):
+    """Run in the child process: call the endpoint and report memory figures"""
+    from fastapi.testclient import TestClient
+    import api_server
+    import main
+
+    method, path, kwargs = build_request(endpoint, profiles, days)
+    with TestClient(api_server.app) as client:
+        # Warm up imports, the HTTP pool and the customer ID on a one-day request
+        warm_method, warm_path, warm_kwargs = build_request(endpoint, 1, 1)
+        client.request(warm_method, warm_path, **warm_kwargs).raise_for_status()
+
+        rss_before = peak_rss_bytes()
+        response = client.request(method, path, **kwargs)
+        response.raise_for_status()
+        rss_peak = peak_rss_bytes()
+        response_bytes = len(response.content)
+        del response
+
+        # Second call under tracemalloc; clear the cache so it does the same work
+        main.stats_cache.clear()
+        tracemalloc.start(10)
+        with PeakSnapshotter() as snapshotter:
+            client.request(method, path, **kwargs).raise_for_status()
+        _, traced_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    snapshot = snapshotter.snapshot.filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__)
+    ])
+    hotspots = [{
+        'site': f"{short_path(stat.traceback[0].filename)}:{stat.traceback[0].lineno}",
+        'bytes': stat.size,
+        'blocks': stat.count
+    } for stat in snapshot.statistics('lineno')[:top]]
+    return {
+        'endpoint': endpoint,
+        'profiles': profiles,
+        'days': days,
+        'rows': profiles * days,
+        'response_bytes': response_bytes,
+        'peak_rss_increase': max(0, rss_peak - rss_before),
+        'traced_peak': traced_peak,
+        'hotspots': hotspots
+    }
+
+
+def run_case(endpoint, profiles, days, top, sprout_url):
+    env = dict(os.environ, SPROUT_BASE_URL=sprout_url, SPROUT_API_KEY='stub-sprout-key',
+               OPENAI_API_KEY='stub-openai-key', CACHE_BACKEND='memory', JOB_BACKEND='memory',
+               LOG_LEVEL='WARNING', STATS_CONCURRENCY='1000', STATS_QUEUE='1000')
+    completed = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.memory', '--child', endpoint, str(profiles), str(days), str(top)],
+        env=env, capture_output=True, text=True
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"{endpoint} {profiles}x{days} failed:\n{completed.stderr}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def report(result):
+    mb = lambda value: f"{value / 1e6:8.2f} MB"
+    print(f"{result['endpoint']:<14} {result['profiles']:>4} x {result['days']:<4} rows {result['rows']:>7}  "
+          f"response {mb(result['response_bytes'])}  peak RSS +{mb(result['peak_rss_increase'])}  "
+          f"traced peak {mb(result['traced_peak'])}", flush=True)
+    for hotspot in result['hotspots']:
+        print(f"    {mb(hotspot['bytes'])} {hotspot['blocks']:>8} blocks  {hotspot['site']}")
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        endpoint, profiles, days, top = sys.argv[2], int(sys.argv[3]), int(sys.argv[4]), int(sys.argv[5])
+        print(json.dumps(measure_case(endpoint, profiles, days, top)))
+        return
+
+    parser = argparse.ArgumentParser(description='Peak memory per request as stats payloads grow')
+    parser.add_argument('--endpoints', nargs='+', choices=ENDPOINTS, default=list(ENDPOINTS))
+    parser.add_argument('--profiles', nargs='+', type=int, default=[1, 10],
+                        help='profile counts (compare and export only; stats endpoints use one profile)')
+    parser.add_argument('--days', nargs='+', type=int, default=[90, 365, 730])
+    parser.add_argument('--top', type=int, default=5, help='allocation sites to show per case')
+    parser.add_argument('--page-size', type=int, default=500, help='daily rows per Sprout analytics page')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    sprout = SproutStub(page_size=args.page_size, profiles=max(args.profiles)).start()
+    results = []
+    try:
+        for endpoint in args.endpoints:
+            profile_counts = args.profiles if endpoint in ('compare', 'export') else [1]
+            for profiles in profile_counts:
+                for days in args.days:
+                    result = run_case(endpoint, profiles, days, args.top, sprout.url)
+                    report(result)
+                    results.append(result)
+    finally:
+        sprout.stop()
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Microbenchmarks for the analytics hot paths, with stored baselines.
+
+Run from the backend directory:
+    python -m benchmarks.micro run [--sizes small medium large]
+    python -m benchmarks.micro save          # record benchmarks/baselines/micro.json
+    python -m benchmarks.micro compare       # exit 1 on a time or peak-memory regression
+    python -m benchmarks.micro compare --sizes large   # worst case too, a few minutes
+
+The default run covers small and medium so the gate stays quick; large has
+its own stored baselines and is compared when asked for.
+
+Time is the best of several timed batches; peak memory is the tracemalloc
+peak of a single call. Time baselines only compare meaningfully on the
+machine that recorded them, so re-save after moving to new hardware.
+"""
+import argparse
+import json
+import platform
+import sys
+import timeit
+import tracemalloc
+from datetime import date
+from pathlib import Path
+
+from analytics import summarize_stats
+from benchmarks.synthetic import make_stats_payload
+from main import analyze_data, compare_quarters, generate_fallback_strategies, get_top_post, \
+    parse_text_strategies_to_json
+from serialization import dumps, loads
+from timeseries import MetricSeries
+
+# (profiles, days) per size; large is the 500 profile, two year worst case
+SIZES = {
+    'small': (1, 30),
+    'medium': (50, 365),
+    'large': (500, 730),
+}
+DEFAULT_SIZES = ('small', 'medium')
+
+BASELINE_PATH = Path(__file__).parent / 'baselines' / 'micro.json'
+
+# Peak memory growth below this many bytes is noise, whatever the percentage
+MEMORY_SLACK = 64 * 1024
+
+
+def strategies_text(count):
+    """Plain-text strategy list like the one OpenAI returns when it ignores the JSON format"""
+    lines = []
+    for strategy in generate_fallback_strategies({})['strategies'] * (count // 5 + 1):
+        lines.append(f"{len(lines) // 6 + 1}. {strategy['title']}")
+        lines.append(f"Description: {strategy['description']}")
+        lines.append(f"Category: {strategy['category']}")
+        lines.append(f"Priority: {strategy['priority']}")
+        lines.extend(f"- {item}" for item in strategy['action_items'][:2])
+        if len(lines) >= count * 6:
+            break
+    return '\n'.join(lines)
+
+
+def build_cases(profiles, days):
+    """Benchmark name -> zero-argument callable, for one data size"""
+    current = make_stats_payload(profiles, days)
+    previous = make_stats_payload(profiles, days, end_date=date(2023, 12, 31))
+    quarters = {'data': {'Q1': previous['data'], 'Q2': current['data']}}
+    totals_q1 = {f'{profile}:{metric}': value
+                 for profile in range(profiles) for metric, value in summarize_stats(previous)['totals'].items()}
+    totals_q2 = {key: value * 1.1 for key, value in totals_q1.items()}
+    posts = [{'id': index, 'engagement': (index * 7919) % 10007} for index in range(profiles * days)]
+    text = strategies_text(max(5, profiles))
+    encoded = dumps(current)
+    # A MetricSeries holds one profile, so the series cases use the first profile's rows
+    first_profile = current['data'][0]['dimensions']['customer_profile_id']
+    profile_rows = [row for row in current['data'] if row['dimensions']['customer_profile_id'] == first_profile]
+    series = MetricSeries.from_rows(profile_rows)
+    return {
+        'analyze_data': lambda: analyze_data(quarters),
+        'compare_quarters': lambda: compare_quarters(totals_q1, totals_q2),
+        'parse_text_strategies': lambda: parse_text_strategies_to_json(text),
+        'get_top_post': lambda: get_top_post(posts),
+        'summarize_stats': lambda: summarize_stats(current, include_daily=True),
+        'series_from_rows': lambda: MetricSeries.from_rows(profile_rows),
+        'summarize_series': lambda: summarize_stats(series, include_daily=True),
+        'json_dumps': lambda: dumps(current),
+        'json_loads': lambda: loads(encoded),
+    }
+
+
+def measure(func, repeat=5):
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat=repeat, number=number)) / number
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'seconds': best, 'peak_bytes': peak}
+
+
+def run(sizes, only=None):
+    results = {}
+    for size in sizes:
+        profiles, days = SIZES[size]
+        for name, func in build_cases(profiles, days).items():
+            if only and name not in only:
+                continue
+            key = f'{name}[{size}]'
+            results[key] = measure(func)
+            print(f"{key:<34} {results[key]['seconds'] * 1000:10.3f} ms  peak {results[key]['peak_bytes'] / 1e6:9.2f} MB",
+                  flush=True)
+    return results
+
+
+def compare(results, baseline, time_threshold, memory_threshold):
+    """Print a comparison against baseline and return the regressed benchmark names"""
+    regressions = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if base is None:
+            print(f"{key:<34} no baseline")
+            continue
+        time_change = result['seconds'] / base['seconds'] - 1
+        memory_change = result['peak_bytes'] / base['peak_bytes'] - 1 if base['peak_bytes'] else 0.0
+        memory_regressed = (memory_change > memory_threshold
+                            and result['peak_bytes'] - base['peak_bytes'] > MEMORY_SLACK)
+        failed = time_change > time_threshold or memory_regressed
+        if failed:
+            regressions.append(key)
+        print(f"{key:<34} time {time_change:+7.1%}  peak {memory_change:+7.1%}  {'REGRESSED' if failed else 'ok'}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Analytics microbenchmarks with baseline regression checks')
+    parser.add_argument('command', choices=['run', 'save', 'compare'])
+    parser.add_argument('--sizes', nargs='+', choices=list(SIZES), default=list(DEFAULT_SIZES))
+    parser.add_argument('--only', nargs='+', help='benchmark names to run (default: all)')
+    parser.add_argument('--baseline', type=Path, default=BASELINE_PATH)
+    parser.add_argument('--time-threshold', type=float, default=0.25, help='allowed slowdown, 0.25 = 25%%')
+    parser.add_argument('--memory-threshold', type=float, default=0.10, help='allowed peak memory growth')
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.only)
+
+    if args.command == 'save':
+        baseline = json.loads(args.baseline.read_text())['results'] if args.baseline.exists() else {}
+        baseline.update(results)
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps({
+            'machine': {'python': platform.python_version(), 'platform': platform.platform(),
+                        'processor': platform.processor() or platform.machine()},
+            'results': dict(sorted(baseline.items()))
+        }, indent=2) + '\n')
+        print(f"Saved {len(results)} results to {args.baseline}")
+    elif args.command == 'compare':
+        regressions = compare(results, json.loads(args.baseline.read_text())['results'],
+                              args.time_threshold, args.memory_threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
+        print("No regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+Local stand-ins for the Sprout Social and OpenAI APIs, so the backend can be
+benchmarked offline. Both run a ThreadingHTTPServer on a daemon thread.
+
+Run standalone from the backend directory:
+    python -m benchmarks.stubs [--sprout-port 9001] [--openai-port 9002] [--latency 0.05]
+
+then start the API server with
+    SPROUT_BASE_URL=http://127.0.0.1:9001/v1 OPENAI_BASE_URL=http://127.0.0.1:9002/v1
+    SPROUT_API_KEY=stub OPENAI_API_KEY=stub
+"""
+import argparse
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.synthetic import SyntheticDataset
+from main import generate_fallback_strategies
+from serialization import dumps, loads
+
+CUSTOMER_ID = 4242
+
+_PROFILE_FILTER = re.compile(r'customer_profile_id\.eq\(([^)]*)\)')
+_PERIOD_FILTER = re.compile(r'reporting_period\.in\((\d{4}-\d{2}-\d{2})\.\.\.(\d{4}-\d{2}-\d{2})\)')
+
+
+class _StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, handler, port, latency=0.0, error_rate=0.0, seed=0):
+        super().__init__(('127.0.0.1', port), handler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.requests = 0
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}/v1'
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name=f'{type(self).__name__}', daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return loads(self.rfile.read(length)) if length else {}
+
+    def _send(self, status, body):
+        data = dumps(body)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _delay_or_fail(self):
+        """Apply the configured latency; True if this request should fail"""
+        server = self.server
+        server.requests += 1
+        if server.latency:
+            time.sleep(server.latency)
+        return server.error_rate and server.random.random() < server.error_rate
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+
+class SproutStubHandler(_StubHandler):
+    def _dispatch(self, method):
+        body = self._read_json() if method == 'POST' else {}
+        if self._delay_or_fail():
+            self._send(503, {'error': 'stub failure'})
+            return
+        path = self.path.split('?')[0]
+        if method == 'GET' and path == '/v1/metadata/client':
+            self._send(200, {'data': [{'customer_id': CUSTOMER_ID, 'name': 'Stub Customer'}]})
+        elif method == 'GET' and path == f'/v1/{CUSTOMER_ID}/metadata/customer':
+            self._send(200, {'data': self.server.dataset.customer_profiles()})
+        elif method == 'POST' and path == f'/v1/{CUSTOMER_ID}/analytics/profiles':
+            self._analytics(body)
+        else:
+            self._send(404, {'error': f'no stub for {method} {path}'})
+
+    def _analytics(self, body):
+        filters = ' '.join(body.get('filters') or [])
+        profile, period = _PROFILE_FILTER.search(filters), _PERIOD_FILTER.search(filters)
+        if profile is None or period is None:
+            self._send(400, {'error': 'customer_profile_id and reporting_period filters are required'})
+            return
+        rows = self.server.dataset.daily_rows(profile.group(1), period.group(1), period.group(2))
+        page_size = self.server.page_size
+        total_pages = max(1, -(-len(rows) // page_size))
+        page = int(body.get('page') or 1)
+        self._send(200, {
+            'data': rows[(page - 1) * page_size:page * page_size],
+            'paging': {'current_page': page, 'total_pages': total_pages}
+        })
+
+
+class SproutStub(_StubServer):
+    """
+    Emulates /metadata/client, /{customer}/metadata/customer and
+    /{customer}/analytics/profiles with page_size daily rows per page,
+    serving a SyntheticDataset (by default profiles profiles from seed).
+    """
+
+    def __init__(self, port=0, latency=0.0, error_rate=0.0, page_size=100, profiles=10, seed=0, dataset=None):
+        super().__init__(SproutStubHandler, port, latency, error_rate, seed)
+        self.page_size = page_size
+        self.dataset = dataset or SyntheticDataset(profiles, seed)
+
+
+class OpenAIStubHandler(_StubHandler):
+    def _dispatch(self, method):
+        body = self._read_json() if method == 'POST' else {}
+        if self._delay_or_fail():
+            self._send(429, {'error': {'message': 'stub rate limit', 'type': 'rate_limit_exceeded'}})
+            return
+        if method != 'POST' or self.path.split('?')[0] != '/v1/chat/completions':
+            self._send(404, {'error': {'message': f'no stub for {method} {self.path}'}})
+            return
+        content = dumps(generate_fallback_strategies({})).decode()
+        self._send(200, {
+            'id': f'chatcmpl-stub-{self.server.requests}',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': body.get('model', 'gpt-3.5-turbo'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': content},
+                'finish_reason': 'stop'
+            }],
+            'usage': {'prompt_tokens': 800, 'completion_tokens': 600, 'total_tokens': 1400}
+        })
+
+
+class OpenAIStub(_StubServer):
+    """Emulates the chat-completions API with a fixed five-strategy answer"""
+
+    def __init__(self, port=0, latency=0.0, error_rate=0.0, seed=0):
+        super().__init__(OpenAIStubHandler, port, latency, error_rate, seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run stub Sprout Social and OpenAI servers')
+    parser.add_argument('--sprout-port', type=int, default=9001)
+    parser.add_argument('--openai-port', type=int, default=9002)
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds added to every Sprout response')
+    parser.add_argument('--openai-latency', type=float, default=1.0, help='seconds added to every completion')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of requests answered with an error')
+    parser.add_argument('--page-size', type=int, default=100, help='daily rows per analytics page')
+    parser.add_argument('--profiles', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0, help='synthetic dataset seed')
+    args = parser.parse_args()
+
+    sprout = SproutStub(args.sprout_port, args.latency, args.error_rate, args.page_size, args.profiles, args.seed).start()
+    openai = OpenAIStub(args.openai_port, args.openai_latency, args.error_rate).start()
+    print(f"Sprout stub: {sprout.url}\nOpenAI stub: {openai.url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        sprout.stop()
+        openai.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Deterministic synthetic Sprout Social analytics data for load and scale
+tests. Each profile gets its own audience size, engagement rate, growth
+trend and network; daily values add weekly and yearly seasonality, noise,
+viral spikes and the occasional zero day (tracking outages).
+
+A day's values depend only on (seed, profile, date), so any date range or
+page of it is consistent with every other request for the same data.
+
+Write a payload to disk from the backend directory:
+    python -m benchmarks.synthetic [--profiles 50] [--days 365] [--seed 0] [--output stats.json]
+"""
+import argparse
+import math
+import random
+import sys
+from datetime import date, timedelta
+
+from analytics import DAY_DIMENSION
+from serialization import dumps
+
+# Day 0 of every profile's growth trend
+EPOCH = date(2020, 1, 1)
+FIRST_PROFILE_ID = 1000
+NETWORKS = ('linkedin_company', 'fb_instagram_account', 'fb_page', 'twitter')
+# Relative activity Monday..Sunday
+WEEKLY = (1.05, 1.1, 1.1, 1.05, 1.0, 0.8, 0.75)
+VIRAL_RATE = 0.01
+OUTAGE_RATE = 0.004
+
+
+class ProfileTraits:
+    __slots__ = ('profile_id', 'name', 'network', 'base_impressions', 'engagement_rate', 'growth', 'phase')
+
+    def __init__(self, seed, profile_id):
+        rng = random.Random(f'{seed}:{profile_id}')
+        self.profile_id = profile_id
+        self.network = rng.choice(NETWORKS)
+        self.name = f'Synthetic {self.network} {profile_id}'
+        self.base_impressions = rng.lognormvariate(7.5, 1.2)
+        self.engagement_rate = rng.uniform(0.01, 0.08)
+        # Yearly growth between -20% and +60%
+        self.growth = rng.uniform(-0.2, 0.6)
+        self.phase = rng.uniform(0, 2 * math.pi)
+
+
+class SyntheticDataset:
+    """Synthetic Sprout data for profiles FIRST_PROFILE_ID .. FIRST_PROFILE_ID + profiles - 1"""
+
+    def __init__(self, profiles=10, seed=0):
+        self.seed = seed
+        self.profile_ids = [FIRST_PROFILE_ID + index for index in range(profiles)]
+        self._traits = {}
+
+    def traits(self, profile_id):
+        traits = self._traits.get(profile_id)
+        if traits is None:
+            traits = self._traits[profile_id] = ProfileTraits(self.seed, profile_id)
+        return traits
+
+    def customer_profiles(self):
+        """Rows for Sprout's /{customer}/metadata/customer"""
+        return [{
+            'customer_profile_id': profile_id,
+            'name': self.traits(profile_id).name,
+            'network_type': self.traits(profile_id).network
+        } for profile_id in self.profile_ids]
+
+    def day_metrics(self, profile_id, day):
+        traits = self.traits(profile_id)
+        t = (day - EPOCH).days
+        rng = random.Random(f'{self.seed}:{traits.profile_id}:{t}')
+        if rng.random() < OUTAGE_RATE:
+            return {'impressions': 0, 'likes': 0, 'reactions': 0, 'comments_count': 0, 'shares_count': 0}
+
+        seasonal = 1 + 0.2 * math.sin(2 * math.pi * day.timetuple().tm_yday / 365.25 + traits.phase)
+        trend = (1 + traits.growth) ** (t / 365.25)
+        impressions = traits.base_impressions * WEEKLY[day.weekday()] * seasonal * trend * rng.lognormvariate(0, 0.25)
+        rate = traits.engagement_rate * rng.lognormvariate(0, 0.3)
+        if rng.random() < VIRAL_RATE:
+            impressions *= rng.uniform(5, 20)
+            rate *= rng.uniform(1.5, 3)
+        likes = impressions * rate
+        return {
+            'impressions': round(impressions),
+            'likes': round(likes),
+            'reactions': round(likes * rng.uniform(1.0, 1.4)),
+            'comments_count': round(likes * rng.uniform(0.03, 0.12)),
+            'shares_count': round(likes * rng.uniform(0.01, 0.08))
+        }
+
+    def daily_rows(self, profile_id, start_date, end_date):
+        """Sprout analytics rows, one per day in the inclusive range"""
+        profile_id = int(profile_id) if str(profile_id).isdigit() else profile_id
+        start, end = date.fromisoformat(str(start_date)), date.fromisoformat(str(end_date))
+        rows = []
+        for offset in range((end - start).days + 1):
+            day = start + timedelta(days=offset)
+            rows.append({
+                'dimensions': {'customer_profile_id': profile_id, DAY_DIMENSION: day.isoformat()},
+                'metrics': self.day_metrics(profile_id, day)
+            })
+        return rows
+
+    def stats_payload(self, start_date, end_date, profile_ids=None):
+        """Single-page /analytics/profiles response covering every profile"""
+        rows = []
+        for profile_id in profile_ids or self.profile_ids:
+            rows.extend(self.daily_rows(profile_id, start_date, end_date))
+        return {'data': rows, 'paging': {'current_page': 1, 'total_pages': 1}}
+
+
+def make_stats_payload(profiles, days, seed=0, end_date=date(2024, 12, 31)):
+    """Payload with profiles x days rows ending at end_date"""
+    start_date = end_date - timedelta(days=days - 1)
+    return SyntheticDataset(profiles, seed).stats_payload(start_date, end_date)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write a synthetic Sprout analytics payload as JSON')
+    parser.add_argument('--profiles', type=int, default=50)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--end-date', type=date.fromisoformat, default=date(2024, 12, 31))
+    parser.add_argument('--output', help='file to write (default: stdout)')
+    args = parser.parse_args()
+
+    data = dumps(make_stats_payload(args.profiles, args.days, args.seed, args.end_date))
+    if args.output:
+        with open(args.output, 'wb') as f:
+            f.write(data)
+    else:
+        sys.stdout.buffer.write(data + b'\n')
+
+
+if __name__ == "__main__":
+    main()
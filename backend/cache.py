@@ -0,0 +1,210 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from serialization import dumps, loads
+from instrumentation import CACHE_REQUESTS
+from tracer import start_span
+
+
+def make_version(value):
+    """Content hash of a cached value; identical data always gets the same version"""
+    return hashlib.blake2b(dumps(value), digest_size=12).hexdigest()
+
+
+class CacheEntry:
+    __slots__ = ('value', 'version', 'expires_at')
+
+    def __init__(self, value, version, expires_at):
+        self.value = value
+        self.version = version
+        self.expires_at = expires_at
+
+    @property
+    def etag(self):
+        """Strong HTTP entity tag for this version of the data"""
+        return f'"{self.version}"'
+
+
+class MemoryCache:
+    """Thread-safe in-process LRU cache with a per-entry TTL"""
+
+    def __init__(self, ttl=900, max_entries=1024, name='cache'):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the live CacheEntry for key, or None"""
+        with start_span('cache.get', **{'cache.name': self.name, 'cache.backend': 'memory'}) as span:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry.expires_at <= time.time():
+                    del self._entries[key]
+                    entry = None
+                if entry is not None:
+                    self._entries.move_to_end(key)
+            if span is not None:
+                span.set_attribute('cache.hit', entry is not None)
+        CACHE_REQUESTS.inc(cache=self.name, result='miss' if entry is None else 'hit')
+        return entry
+
+    def set(self, key, value, ttl=None):
+        """Store value under key and return its CacheEntry"""
+        entry = CacheEntry(value, make_version(value), time.time() + (ttl or self.ttl))
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def keys(self, prefix=''):
+        """Keys of stored entries starting with prefix, expired or not"""
+        with self._lock:
+            return [key for key in self._entries if key.startswith(prefix)]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def purge_expired(self):
+        """Drop expired entries; returns how many were removed"""
+        now = time.time()
+        with self._lock:
+            expired = [key for key, entry in self._entries.items() if entry.expires_at <= now]
+            for key in expired:
+                del self._entries[key]
+        return len(expired)
+
+    def close(self):
+        pass
+
+
+# Cache names become SQLite table names, so only plain identifiers are allowed
+_CACHE_NAME = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+class SQLiteCache:
+    """
+    Cache shared by every worker process on the host, backed by a SQLite file
+    in WAL mode. Values are stored as JSON, so reads return fresh copies.
+    Each named cache has its own table in the file, so eviction, purging and
+    clearing one never touch another.
+    """
+
+    # Evict down to max_entries once every this many writes
+    EVICT_EVERY = 64
+
+    def __init__(self, path, ttl=900, max_entries=4096, name='cache'):
+        if not _CACHE_NAME.match(name):
+            raise ValueError(f"Invalid cache name: {name!r}")
+        self.name = name
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._table = f'cache_{name}'
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._writes = 0
+        with self._connect() as conn:
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self._table} ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, version TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {self._table}_expires_at ON {self._table} (expires_at)")
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def get(self, key):
+        with start_span('cache.get', **{'cache.name': self.name, 'cache.backend': 'sqlite'}) as span:
+            row = self._connect().execute(
+                f"SELECT value, version, expires_at FROM {self._table} WHERE key = ? AND expires_at > ?",
+                (key, time.time())
+            ).fetchone()
+            if span is not None:
+                span.set_attribute('cache.hit', row is not None)
+            CACHE_REQUESTS.inc(cache=self.name, result='miss' if row is None else 'hit')
+            if row is None:
+                return None
+            return CacheEntry(loads(row[0]), row[1], row[2])
+
+    def set(self, key, value, ttl=None):
+        data = dumps(value)
+        entry = CacheEntry(value, hashlib.blake2b(data, digest_size=12).hexdigest(), time.time() + (ttl or self.ttl))
+        conn = self._connect()
+        conn.execute(
+            f"INSERT OR REPLACE INTO {self._table} (key, value, version, expires_at) VALUES (?, ?, ?, ?)",
+            (key, data, entry.version, entry.expires_at)
+        )
+        self._writes += 1
+        if self._writes % self.EVICT_EVERY == 0:
+            self.purge_expired()
+            conn.execute(
+                f"DELETE FROM {self._table} WHERE key IN "
+                f"(SELECT key FROM {self._table} ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+        return entry
+
+    def delete(self, key):
+        self._connect().execute(f"DELETE FROM {self._table} WHERE key = ?", (key,))
+
+    def keys(self, prefix=''):
+        """Keys of stored entries starting with prefix, expired or not"""
+        if not prefix:
+            return [row[0] for row in self._connect().execute(f"SELECT key FROM {self._table}")]
+        # A key range rather than LIKE, so the primary key index is used
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        return [row[0] for row in self._connect().execute(
+            f"SELECT key FROM {self._table} WHERE key >= ? AND key < ?", (prefix, upper))]
+
+    def clear(self):
+        self._connect().execute(f"DELETE FROM {self._table}")
+
+    def purge_expired(self):
+        return self._connect().execute(f"DELETE FROM {self._table} WHERE expires_at <= ?", (time.time(),)).rowcount
+
+    def close(self):
+        """Close the connections opened by every thread"""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+
+def create_cache(name, ttl=900):
+    """
+    Build the cache selected by CACHE_BACKEND ("memory" or "sqlite").
+    Defaults to sqlite when WEB_CONCURRENCY asks for several workers, so they
+    share one warm cache instead of each filling their own.
+    """
+    backend = os.environ.get('CACHE_BACKEND')
+    if not backend:
+        backend = 'sqlite' if int(os.environ.get('WEB_CONCURRENCY', 1)) > 1 else 'memory'
+    if backend == 'sqlite':
+        return SQLiteCache(os.environ.get('CACHE_PATH', 'cache.sqlite3'), ttl=ttl, name=name)
+    if backend == 'memory':
+        return MemoryCache(ttl=ttl, name=name)
+    raise ValueError(f"Unknown CACHE_BACKEND: {backend}")
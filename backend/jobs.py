@@ -0,0 +1,230 @@
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from serialization import dumps, loads
+from logging_setup import get_logger
+from tracer import start_span
+
+logger = get_logger('jobs')
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+
+
+class MemoryJobStore:
+    """Jobs kept in this process only; lost on restart"""
+
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def save(self, job):
+        with self._lock:
+            self._jobs[job['id']] = dict(job)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def purge(self, older_than):
+        """Remove finished jobs last updated before the older_than timestamp"""
+        with self._lock:
+            stale = [job_id for job_id, job in self._jobs.items()
+                     if job['status'] in (SUCCEEDED, FAILED) and job['updated_at'] < older_than]
+            for job_id in stale:
+                del self._jobs[job_id]
+        return len(stale)
+
+    def close(self):
+        pass
+
+
+class SQLiteJobStore:
+    """Durable job store shared by every worker process on the host"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, status TEXT NOT NULL, updated_at REAL NOT NULL, job BLOB NOT NULL)"
+            )
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def save(self, job):
+        self._connect().execute(
+            "INSERT OR REPLACE INTO jobs (id, status, updated_at, job) VALUES (?, ?, ?, ?)",
+            (job['id'], job['status'], job['updated_at'], dumps(job))
+        )
+
+    def get(self, job_id):
+        row = self._connect().execute("SELECT job FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return loads(row[0]) if row else None
+
+    def purge(self, older_than):
+        return self._connect().execute(
+            "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?", (SUCCEEDED, FAILED, older_than)
+        ).rowcount
+
+    def close(self):
+        """Close the connections opened by every thread (job workers included)"""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+
+def create_job_store():
+    """
+    Build the job store selected by JOB_BACKEND ("memory" or "sqlite").
+    Defaults to sqlite when several workers run, so any worker can report on
+    a job another one accepted.
+    """
+    backend = os.environ.get('JOB_BACKEND')
+    if not backend:
+        backend = 'sqlite' if int(os.environ.get('WEB_CONCURRENCY', 1)) > 1 else 'memory'
+    if backend == 'sqlite':
+        return SQLiteJobStore(os.environ.get('JOB_DB_PATH', 'jobs.sqlite3'))
+    if backend == 'memory':
+        return MemoryJobStore()
+    raise ValueError(f"Unknown JOB_BACKEND: {backend}")
+
+
+class JobQueue:
+    """
+    In-process job queue drained by a thread pool. Handlers are registered per
+    job type and called as handler(params, progress), where progress(done, total)
+    records how far the job has got.
+    """
+
+    def __init__(self, store, workers=4):
+        self.store = store
+        self.workers = workers
+        self._handlers = {}
+        self._executor = None
+        self._pending = set()
+        # job ID -> Future of jobs submitted and not finished yet
+        self._futures = {}
+        # Jobs given up on at shutdown; their workers' late updates are dropped
+        self._abandoned = set()
+        self._lock = threading.Lock()
+
+    def register(self, job_type, handler):
+        self._handlers[job_type] = handler
+
+    @property
+    def job_types(self):
+        return sorted(self._handlers)
+
+    def start(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='job')
+
+    def submit(self, job_type, params):
+        """Enqueue a job and return its record immediately"""
+        if job_type not in self._handlers:
+            raise ValueError(f"Unknown job type: {job_type}")
+        if self._executor is None:
+            raise RuntimeError("Job queue is not running")
+        now = time.time()
+        job = {
+            'id': uuid.uuid4().hex,
+            'type': job_type,
+            'status': QUEUED,
+            'progress': {'done': 0, 'total': None},
+            'result': None,
+            'error': None,
+            'created_at': now,
+            'updated_at': now
+        }
+        self.store.save(job)
+        with self._lock:
+            self._pending.add(job['id'])
+        # The worker mutates its own copy, so the caller sees the queued record
+        future = self._executor.submit(self._run, dict(job), params)
+        with self._lock:
+            self._futures[job['id']] = future
+        future.add_done_callback(lambda _: self._forget(job['id']))
+        return job
+
+    def _forget(self, job_id):
+        with self._lock:
+            self._futures.pop(job_id, None)
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    def _update(self, job, **changes):
+        job.update(changes, updated_at=time.time())
+        self.store.save(job)
+
+    def _report(self, job, **changes):
+        """Update from the worker running job, unless shutdown already failed it"""
+        with self._lock:
+            if job['id'] in self._abandoned:
+                return
+            self._update(job, **changes)
+
+    def _run(self, job, params):
+        with self._lock:
+            self._pending.discard(job['id'])
+
+        def progress(done, total=None):
+            self._report(job, progress={'done': done, 'total': total})
+
+        self._report(job, status=RUNNING)
+        try:
+            with start_span(f"job {job['type']}", **{'job.id': job['id']}):
+                result = self._handlers[job['type']](params, progress)
+        except Exception as e:
+            logger.exception("Job failed", extra={'job_id': job['id'], 'job_type': job['type']})
+            self._report(job, status=FAILED, error=str(e))
+        else:
+            self._report(job, status=SUCCEEDED, result=result)
+
+    def shutdown(self, timeout=None):
+        """
+        Give running jobs up to timeout seconds (None waits for them) to finish.
+        Jobs still queued, and jobs still running after the timeout, are marked
+        failed; a worker that finishes later cannot overwrite that.
+        """
+        if self._executor is None:
+            return
+        executor, self._executor = self._executor, None
+        executor.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            futures = list(self._futures.values())
+        wait(futures, timeout=timeout)
+        with self._lock:
+            cancelled, self._pending = self._pending, set()
+            unfinished = [job_id for job_id, future in self._futures.items() if not future.done()]
+            self._abandoned.update(unfinished)
+        for job_id in cancelled:
+            job = self.store.get(job_id)
+            if job is not None and job['status'] == QUEUED:
+                self._update(job, status=FAILED, error="Cancelled by server shutdown")
+        for job_id in unfinished:
+            job = self.store.get(job_id)
+            if job is not None and job['status'] == RUNNING:
+                logger.warning("Job still running at shutdown", extra={'job_id': job_id, 'job_type': job['type']})
+                self._update(job, status=FAILED, error="Server shut down before the job finished")
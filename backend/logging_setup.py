@@ -0,0 +1,137 @@
+"""
+Structured logging for the backend. Records are formatted as JSON lines (or
+plain text with LOG_FORMAT=text) on a background thread fed through a queue,
+so request threads never block on stderr. Credentials are redacted and
+high-volume events can be sampled with extra={'sample_rate': 0.01}.
+"""
+import atexit
+import copy
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+
+from serialization import dumps
+
+# Attributes every LogRecord has; anything else came in through extra= and is logged as a field
+_RESERVED_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'sample_rate'}
+
+_SECRET_PATTERNS = [
+    (re.compile(r'(Bearer\s+)[A-Za-z0-9._~+/=-]+', re.IGNORECASE), r'\1[REDACTED]'),
+    (re.compile(r'\bsk-[A-Za-z0-9_-]{8,}'), '[REDACTED]'),
+]
+_SECRET_FIELDS = {'authorization', 'api_key', 'sprout_api_key', 'openai_api_key', 'password', 'token'}
+
+_listener = None
+# Secrets loaded from somewhere other than the environment (e.g. config.json); replaced, never mutated
+_registered_secrets = ()
+
+
+def register_secrets(*secrets):
+    """Mask these values wherever they are logged, as the API key environment variables are"""
+    global _registered_secrets
+    _registered_secrets = tuple(set(_registered_secrets) | {secret for secret in secrets if secret})
+
+
+def redact(value):
+    """Mask bearer tokens, OpenAI keys and configured secrets in a string"""
+    for pattern, replacement in _SECRET_PATTERNS:
+        value = pattern.sub(replacement, value)
+    for secret in (os.environ.get('SPROUT_API_KEY'), os.environ.get('OPENAI_API_KEY'), *_registered_secrets):
+        if secret and len(secret) >= 8:
+            value = value.replace(secret, '[REDACTED]')
+    return value
+
+
+def _redact_field(name, value):
+    if name.lower() in _SECRET_FIELDS:
+        return '[REDACTED]'
+    if isinstance(value, str):
+        return redact(value)
+    if isinstance(value, dict):
+        return {key: _redact_field(key, item) for key, item in value.items()}
+    return value
+
+
+class RedactionFilter(logging.Filter):
+    def filter(self, record):
+        record.msg = redact(record.getMessage())
+        record.args = None
+        for name, value in list(vars(record).items()):
+            if name not in _RESERVED_ATTRS:
+                setattr(record, name, _redact_field(name, value))
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep a record with probability record.sample_rate (default 1)"""
+
+    def filter(self, record):
+        rate = getattr(record, 'sample_rate', 1)
+        return rate >= 1 or random.random() < rate
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that keeps the traceback separate from the message"""
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        if record.exc_info:
+            record.exc_text = redact(logging.Formatter().formatException(record.exc_info))
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_info = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        for name, value in vars(record).items():
+            if name not in _RESERVED_ATTRS:
+                entry[name] = value
+        if record.exc_text:
+            entry['exc_info'] = record.exc_text
+        return dumps(entry).decode('utf-8')
+
+
+def get_logger(name):
+    return logging.getLogger(f'analytics.{name}')
+
+
+def configure_logging():
+    """
+    Route the 'analytics' loggers through a non-blocking queue to stderr.
+    LOG_LEVEL (default INFO) and LOG_FORMAT (json or text) control output.
+    Safe to call more than once.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    stream_handler = logging.StreamHandler()
+    if os.environ.get('LOG_FORMAT', 'json') == 'text':
+        stream_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+    else:
+        stream_handler.setFormatter(JsonFormatter())
+
+    # Filters run on the calling thread so dropped records never reach the queue
+    queue_handler = _QueueHandler(queue.SimpleQueue())
+    queue_handler.addFilter(SamplingFilter())
+    queue_handler.addFilter(RedactionFilter())
+
+    logger = logging.getLogger('analytics')
+    logger.setLevel(os.environ.get('LOG_LEVEL', 'INFO').upper())
+    logger.addHandler(queue_handler)
+    logger.propagate = False
+
+    _listener = logging.handlers.QueueListener(queue_handler.queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
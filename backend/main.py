@@ -2,41 +2,208 @@ from datetime import datetime
 import os
 import json
 import requests
+from requests.adapters import HTTPAdapter
+from contextlib import contextmanager
 from datetime import datetime, timedelta
-from openai import OpenAI
+import threading
 import time
+from analytics import PROFILE_METRICS
+from timeseries import MetricSeries, to_ordinal
+from serialization import loads
+from cache import create_cache
+from instrumentation import UPSTREAM_LATENCY, UPSTREAM_IN_FLIGHT, OPENAI_TOKENS
+from logging_setup import configure_logging, get_logger, register_secrets
+from tracer import SPAN_KIND_CLIENT, inject_traceparent, start_span
+from warehouse import create_warehouse
+from metricstore import create_metric_store
+
+logger = get_logger('sprout')
+
+# API keys and the OpenAI client are loaded on first use rather than at import,
+# so the API server can start (and answer /health) before keys are configured
+_config = None
+# time.monotonic() after which _config is loaded again; never, once every key is set
+_config_expires = 0.0
+_openai_client = None
+_http_session = None
+_customer_id = None
+_init_lock = threading.Lock()
+
+# Upstream (Sprout/OpenAI) requests currently in flight, so shutdown can drain them
+_inflight = 0
+_inflight_cond = threading.Condition()
 
-# Load API keys from environment variables or config file
-SPROUT_API_KEY = os.environ.get('SPROUT_API_KEY')
-OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
+# Sprout Social API setup
+BASE_URL = os.environ.get('SPROUT_BASE_URL', 'https://api.sproutsocial.com/v1')
+SPROUT_TIMEOUT = float(os.environ.get('SPROUT_TIMEOUT', 30))
+HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', 20))
+SPROUT_LOG_SAMPLE_RATE = float(os.environ.get('SPROUT_LOG_SAMPLE_RATE', 0.01))
+# Seconds a configuration with a missing key is used before the environment and config.json are read again
+CONFIG_RETRY_INTERVAL = float(os.environ.get('CONFIG_RETRY_INTERVAL', 30))
+
+def load_config():
+    """Read API keys from environment variables, falling back to config.json"""
+    sprout_api_key = os.environ.get('SPROUT_API_KEY')
+    openai_api_key = os.environ.get('OPENAI_API_KEY')
+
+    # Fallback to config file if environment variables are not set
+    if not sprout_api_key or not openai_api_key:
+        try:
+            with open('config.json') as f:
+                config = json.load(f)
+            sprout_api_key = sprout_api_key or config.get('sprout_api_key')
+            openai_api_key = openai_api_key or config.get('openai_api_key')
+        except FileNotFoundError:
+            logger.warning("config.json not found and environment variables not set")
+
+    # Keys read from config.json are not in the environment the log redaction checks
+    register_secrets(sprout_api_key, openai_api_key)
+    return {'sprout_api_key': sprout_api_key, 'openai_api_key': openai_api_key}
+
+def get_config():
+    """
+    Configuration, loaded on first use. A configuration missing a key is
+    reloaded every CONFIG_RETRY_INTERVAL seconds, so keys added to the
+    environment or config.json after startup are picked up without a restart.
+    """
+    global _config, _config_expires
+    if _config is None or time.monotonic() >= _config_expires:
+        with _init_lock:
+            if _config is None or time.monotonic() >= _config_expires:
+                config = load_config()
+                _config_expires = float('inf') if all(config.values()) else time.monotonic() + CONFIG_RETRY_INTERVAL
+                _config = config
+    return _config
+
+def get_sprout_api_key():
+    api_key = get_config()['sprout_api_key']
+    if not api_key:
+        raise ValueError("SPROUT_API_KEY environment variable or config.json sprout_api_key is required")
+    return api_key
+
+def sprout_headers():
+    return {
+        'Authorization': f'Bearer {get_sprout_api_key()}',  # Always use Bearer prefix
+        'Content-Type': 'application/json',
+        'Accept': 'application/json'
+    }
 
-# Fallback to config file if environment variables are not set
-if not SPROUT_API_KEY or not OPENAI_API_KEY:
+def get_openai_client():
+    """OpenAI client, constructed (and the SDK imported) on first use"""
+    global _openai_client
+    if _openai_client is None:
+        api_key = get_config()['openai_api_key']
+        if not api_key:
+            raise ValueError("OPENAI_API_KEY environment variable or config.json openai_api_key is required")
+        with _init_lock:
+            if _openai_client is None:
+                from openai import OpenAI
+                _openai_client = OpenAI(api_key=api_key)
+    return _openai_client
+
+def get_http_session():
+    """Shared requests session with a keep-alive connection pool"""
+    global _http_session
+    if _http_session is None:
+        with _init_lock:
+            if _http_session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _http_session = session
+    return _http_session
+
+def close_http_session():
+    global _http_session
+    with _init_lock:
+        session, _http_session = _http_session, None
+    if session is not None:
+        session.close()
+
+@contextmanager
+def upstream_call(service, endpoint):
+    """
+    Count an upstream request as in flight for the duration of the block and
+    record its latency. The block may set call['status'] (e.g. the HTTP code).
+    """
+    global _inflight
+    with _inflight_cond:
+        _inflight += 1
+    UPSTREAM_IN_FLIGHT.inc(service=service)
+    call = {'status': 'ok'}
+    start = time.perf_counter()
     try:
-        with open('config.json') as f:
-            config = json.load(f)
-        SPROUT_API_KEY = SPROUT_API_KEY or config.get('sprout_api_key')
-        OPENAI_API_KEY = OPENAI_API_KEY or config.get('openai_api_key')
-    except FileNotFoundError:
-        print("Warning: config.json not found and environment variables not set")
-
-if not SPROUT_API_KEY:
-    raise ValueError("SPROUT_API_KEY environment variable or config.json sprout_api_key is required")
-if not OPENAI_API_KEY:
-    raise ValueError("OPENAI_API_KEY environment variable or config.json openai_api_key is required")
-
-# Configure OpenAI client
-client = OpenAI(api_key=OPENAI_API_KEY)
-
-# Configure OpenAI
+        with start_span(f'{service} {endpoint}', kind=SPAN_KIND_CLIENT,
+                        **{'peer.service': service, 'upstream.endpoint': endpoint}) as span:
+            yield call
+            if span is not None:
+                span.set_attribute('upstream.status', call['status'])
+    except Exception:
+        call['status'] = 'error'
+        raise
+    finally:
+        UPSTREAM_LATENCY.observe(time.perf_counter() - start, service=service, endpoint=endpoint, status=call['status'])
+        UPSTREAM_IN_FLIGHT.dec(service=service)
+        with _inflight_cond:
+            _inflight -= 1
+            if _inflight == 0:
+                _inflight_cond.notify_all()
+
+def drain_upstream(timeout):
+    """Wait up to timeout seconds for in-flight upstream requests; True if none remain"""
+    with _inflight_cond:
+        return _inflight_cond.wait_for(lambda: _inflight == 0, timeout=timeout)
+
+def sprout_request(method, url, endpoint, **kwargs):
+    """Issue a Sprout Social API request over the pooled session; endpoint names it in metrics"""
+    kwargs.setdefault('timeout', SPROUT_TIMEOUT)
+    with upstream_call('sprout', endpoint) as call:
+        kwargs['headers'] = inject_traceparent(dict(kwargs.get('headers') or {}))
+        response = get_http_session().request(method, url, **kwargs)
+        call['status'] = response.status_code
+    # Per-call detail is high volume, so only a sample of successful calls is logged
+    logger.debug("Sprout request", extra={'endpoint': endpoint, 'status': response.status_code,
+                                          'sample_rate': 1 if response.status_code >= 400 else SPROUT_LOG_SAMPLE_RATE})
+    return response
+
+def readiness():
+    """Which upstream credentials are configured, without calling any upstream"""
+    config = get_config()
+    return {
+        'sprout_api_key': bool(config['sprout_api_key']),
+        'openai_api_key': bool(config['openai_api_key'])
+    }
 
-# Sprout Social API setup
-BASE_URL = 'https://api.sproutsocial.com/v1'
-HEADERS = {
-    'Authorization': f'Bearer {SPROUT_API_KEY}',  # Always use Bearer prefix
-    'Content-Type': 'application/json',
-    'Accept': 'application/json'
-}
+# The stores below are created by open_stores (the API server's lifespan calls
+# it at startup), so importing this module opens no files or connections.
+# Profile stats cache, keyed by profile and date range (see cache.create_cache)
+stats_cache = None
+# Memory-mapped series of recently requested profiles, shared by every worker (None unless METRIC_STORE_PATH is set)
+metric_store = None
+# Settled daily metrics on disk, so historical ranges skip Sprout (None unless WAREHOUSE_PATH is set)
+warehouse = None
+
+def open_stores():
+    """Create the stats cache, metric store and warehouse; does nothing if they are open"""
+    global stats_cache, metric_store, warehouse
+    with _init_lock:
+        if stats_cache is None:
+            cache = create_cache('stats', ttl=int(os.environ.get('STATS_CACHE_TTL', 900)))
+            metric_store = create_metric_store(ttl=cache.ttl)
+            warehouse = create_warehouse()
+            stats_cache = cache
+
+def close_stores():
+    """Close the stores opened by open_stores"""
+    global stats_cache, metric_store, warehouse
+    with _init_lock:
+        cache, store = stats_cache, metric_store
+        stats_cache = metric_store = warehouse = None
+    if cache is not None:
+        cache.close()
+    if store is not None:
+        store.close()
 
 def track_token_usage(tokens_used):
     """Track daily token usage"""
@@ -55,45 +222,34 @@ def track_token_usage(tokens_used):
         with open(usage_file, 'w') as f:
             json.dump(usage, f)
             
-        print(f"\nDaily token usage: {usage[today]} tokens")
+        logger.info("Daily token usage", extra={'tokens_today': usage[today]})
         if usage[today] > 50000:  # Warning at 10% of monthly free tier
-            print("Warning: Approaching daily token usage limit!")
+            logger.warning("Approaching daily token usage limit", extra={'tokens_today': usage[today]})
             
-    except Exception as e:
-        print(f"Error tracking token usage: {e}")
+    except Exception:
+        logger.exception("Error tracking token usage")
 
 # First get customer ID
 def get_customer_id():
     url = f"{BASE_URL}/metadata/client"
-    print(f"Getting customer ID from: {url}")
 
     # Try first without Bearer prefix
-    print("\nTrying without Bearer prefix...")
-    headers = HEADERS.copy()
-    print(f"Using headers: {json.dumps({k: v[:20] + '...' if k == 'Authorization' else v for k, v in headers.items()}, indent=2)}")
-
-    response = requests.get(url, headers=headers)
-    print(f"Response status code: {response.status_code}")
-    print(f"Response headers: {dict(response.headers)}")
+    headers = sprout_headers()
+    response = sprout_request('GET', url, 'metadata/client', headers=headers)
 
     # If first attempt fails, try with Bearer prefix
     if response.status_code == 401:
-        print("\nTrying with Bearer prefix...")
-        headers['Authorization'] = f'Bearer {SPROUT_API_KEY}'
-        print(f"Using headers: {json.dumps({k: v[:20] + '...' if k == 'Authorization' else v for k, v in headers.items()}, indent=2)}")
-
-        response = requests.get(url, headers=headers)
-        print(f"Response status code: {response.status_code}")
-        print(f"Response headers: {dict(response.headers)}")
+        logger.info("Customer ID lookup unauthorized, retrying with Bearer prefix")
+        headers['Authorization'] = f'Bearer {get_sprout_api_key()}'
+        response = sprout_request('GET', url, 'metadata/client', headers=headers)
 
     if response.status_code != 200:
-        print(f"Error response body: {response.text}")
+        logger.error("Customer ID lookup failed", extra={'status': response.status_code, 'body': response.text[:500]})
         if response.status_code == 401:
-            print("\nAuthorization failed. Please check:")
-            print("1. Your API key is correct and active in Sprout Social")
-            print("2. You have accepted the API Terms of Service in Sprout Social settings")
-            print("3. Your account has API access enabled")
-            print("4. You have the API Permissions permission in your Sprout Social account")
+            logger.error(
+                "Sprout Social authorization failed: check the API key is correct and active, the API Terms "
+                "of Service are accepted, API access is enabled and the account has the API Permissions permission"
+            )
         raise Exception(f"API Error: {response.status_code} - {response.text}")
 
     data = response.json()
@@ -101,57 +257,145 @@ def get_customer_id():
         raise Exception("No customer ID found in response")
     return data['data'][0]['customer_id']
 
+def resolve_customer_id():
+    """Customer ID, fetched once and reused for every later Sprout call"""
+    global _customer_id
+    with start_span('sprout.resolve_customer_id') as span:
+        if span is not None:
+            span.set_attribute('cache.hit', _customer_id is not None)
+        if _customer_id is None:
+            _customer_id = get_customer_id()
+    return _customer_id
+
 # Example: List available profiles
 def list_profiles():
     # First get the customer ID
-    customer_id = get_customer_id()
+    customer_id = resolve_customer_id()
 
     url = f"{BASE_URL}/{customer_id}/metadata/customer"
-    print(f"\nGetting profiles from: {url}")
-    print(f"Using headers: {json.dumps({k: v[:20] + '...' if k == 'Authorization' else v for k, v in HEADERS.items()}, indent=2)}")
-
-    response = requests.get(url, headers=HEADERS)
-    print(f"Response status code: {response.status_code}")
-    print(f"Response headers: {dict(response.headers)}")
+    response = sprout_request('GET', url, 'metadata/customer', headers=sprout_headers())
 
     if response.status_code != 200:
-        print(f"Error response body: {response.text}")
+        logger.error("Profile list request failed", extra={'status': response.status_code, 'body': response.text[:500]})
         raise Exception(f"API Error: {response.status_code} - {response.text}")
-    return response.json()
+    return loads(response.content)
+
+def stats_cache_key(profile_id, start_date, end_date):
+    return f"stats:{profile_id}:{start_date}:{end_date}"
+
+def peek_profile_stats_entry(profile_id, start_date, end_date):
+    """Profile stats CacheEntry from the metric store or stats cache, or None; never fetches"""
+    if metric_store is not None:
+        entry = metric_store.get(profile_id, start_date, end_date)
+        if entry is not None:
+            return entry
+    return stats_cache.get(stats_cache_key(profile_id, start_date, end_date))
+
+def get_profile_stats_entry(profile_id, start_date, end_date):
+    """
+    Cached profile stats as a CacheEntry, fetching from Sprout on a miss.
+    The value is MetricSeries.to_dict(); use get_profile_stats for the series.
+    """
+    entry = peek_profile_stats_entry(profile_id, start_date, end_date)
+    if entry is None and metric_store is not None and metric_store.accepts(profile_id):
+        entry = refresh_metric_store(profile_id, start_date, end_date)
+    if entry is None:
+        entry = stats_cache.set(stats_cache_key(profile_id, start_date, end_date),
+                                load_profile_stats(profile_id, start_date, end_date).to_dict())
+    return entry
+
+def refresh_metric_store(profile_id, start_date, end_date):
+    """
+    Fetch the days of the range the metric store cannot serve (on a refresh,
+    only the unsettled tail and any new days), merge them in and return the
+    store's entry for the range. Cached stats whose range includes a day that
+    changed are invalidated; every other entry stays valid.
+    """
+    fetch_start = metric_store.refresh_start(profile_id, start_date, end_date)
+    series = load_profile_stats(profile_id, fetch_start, end_date)
+    changed = metric_store.put(profile_id, series, fetch_start, end_date)
+    if changed is not None:
+        invalidate_profile_stats(profile_id, *changed)
+    return metric_store.get(profile_id, start_date, end_date)
+
+def invalidate_profile_stats(profile_id, first_day, last_day):
+    """Delete the profile's cached stats for ranges overlapping first_day..last_day (ordinals)"""
+    for key in stats_cache.keys(f"stats:{profile_id}:"):
+        start_date, end_date = key.rsplit(':', 2)[1:]
+        try:
+            overlaps = to_ordinal(start_date) <= last_day and to_ordinal(end_date) >= first_day
+        except ValueError:
+            overlaps = True
+        if overlaps:
+            stats_cache.delete(key)
 
-# Example: Fetch profile stats
 def get_profile_stats(profile_id, start_date, end_date):
-    # Get list of available profiles first
-    try:
-        profiles = list_profiles()
-        print("\nAvailable profiles:")
-        for profile in profiles.get('profiles', []):
-            print(f"ID: {profile.get('id')}, Name: {profile.get('name')}")
-    except Exception as e:
-        print(f"Could not fetch profiles list: {str(e)}")
+    """Daily metrics for a profile and date range as a MetricSeries"""
+    return MetricSeries.from_dict(get_profile_stats_entry(profile_id, start_date, end_date).value)
+
+def get_range_totals(profile_id, start_date, end_date, metrics=PROFILE_METRICS):
+    """
+    (days with data, {metric: total}) for a profile and date range. Constant
+    time from the metric store's prefix sums when it holds the range,
+    otherwise summed from the cached or freshly fetched series.
+    """
+    if metric_store is not None:
+        result = metric_store.range_totals(profile_id, start_date, end_date, metrics)
+        if result is not None:
+            return result
+    series = get_profile_stats(profile_id, start_date, end_date)
+    return len(series), series.totals(metrics)
+
+def load_profile_stats(profile_id, start_date, end_date):
+    """
+    MetricSeries for the range, read from the local warehouse when it holds
+    every day of it, otherwise fetched from Sprout and stored for next time
+    """
+    # IDs the warehouse cannot store skip it rather than failing after the fetch
+    if warehouse is None or not warehouse.accepts(profile_id):
+        return fetch_profile_stats(profile_id, start_date, end_date)
+    customer_id = resolve_customer_id()
+    if not warehouse.accepts(customer_id):
+        return fetch_profile_stats(profile_id, start_date, end_date)
+    if warehouse.covers(customer_id, profile_id, start_date, end_date):
+        return warehouse.read(customer_id, profile_id, start_date, end_date)
+    series = fetch_profile_stats(profile_id, start_date, end_date)
+    warehouse.write(customer_id, series, start_date, end_date)
+    return series
+
+# Example: Fetch profile stats
+def fetch_profile_stats(profile_id, start_date, end_date):
+    # Sprout paginates long date ranges; each page is packed into columns as it arrives
+    return MetricSeries.from_pages(iter_profile_stats_pages(profile_id, start_date, end_date), PROFILE_METRICS,
+                                   profile_id=profile_id)
 
+def iter_profile_stats_pages(profile_id, start_date, end_date):
+    """Yield Sprout's analytics response one page at a time, so callers can stream it"""
     # Get customer ID first if not already fetched
-    customer_id = get_customer_id()
+    customer_id = resolve_customer_id()
 
     # Then get the stats using POST request as per documentation
     url = f"{BASE_URL}/{customer_id}/analytics/profiles"
-    data = {
-        "filters": [
-            f"customer_profile_id.eq({profile_id})",
-            f"reporting_period.in({start_date}...{end_date})"
-        ],
-        "metrics": [
-            "impressions",
-            "likes",
-            "reactions",
-            "comments_count",
-            "shares_count"
-        ]
-    }
-    response = requests.post(url, headers=HEADERS, json=data)
-    if response.status_code != 200:
-        raise Exception(f"API Error: {response.status_code} - {response.text}")
-    return response.json()
+    page = 1
+    while True:
+        data = {
+            "filters": [
+                f"customer_profile_id.eq({profile_id})",
+                f"reporting_period.in({start_date}...{end_date})"
+            ],
+            "metrics": PROFILE_METRICS,
+            "page": page
+        }
+        response = sprout_request('POST', url, 'analytics/profiles', headers=sprout_headers(), json=data)
+        if response.status_code != 200:
+            raise Exception(f"API Error: {response.status_code} - {response.text}")
+        payload = loads(response.content)
+        yield payload
+
+        total_pages = (payload.get('paging') or {}).get('total_pages') or 1
+        if page >= total_pages:
+            break
+        page += 1
 
 # Example: Compare quarters
 def compare_quarters(stats_q1, stats_q2):
@@ -183,6 +427,22 @@ def check_okr_status(current, target):
 def get_top_post(posts):
     return max(posts, key=lambda x: x['engagement'])
 
+def quarter_totals(days):
+    """Totals of the metrics analyze_data compares, from daily rows or a MetricSeries"""
+    metrics = ['likes', 'comments_count', 'shares_count', 'impressions']
+    if days is None:
+        return dict.fromkeys(metrics, 0)
+    if isinstance(days, MetricSeries):
+        return days.totals(metrics)
+    likes = comments = shares = impressions = 0
+    for day in days:
+        day_metrics = day.get('metrics', {})
+        likes += day_metrics.get('likes') or 0
+        comments += day_metrics.get('comments_count') or 0
+        shares += day_metrics.get('shares_count') or 0
+        impressions += day_metrics.get('impressions') or 0
+    return {'likes': likes, 'comments_count': comments, 'shares_count': shares, 'impressions': impressions}
+
 # ChatGPT integration
 def analyze_data(data):
     """Basic data analysis without using OpenAI API"""
@@ -193,32 +453,14 @@ def analyze_data(data):
             # If it's not valid JSON, return a basic message
             return "Could not parse data for analysis. Using default recommendations:\n1. Focus on creating engaging content\n2. Maintain regular posting schedule\n3. Engage with your audience through comments and replies\n4. Track your metrics regularly"
 
-    total_likes_q1 = 0
-    total_likes_q2 = 0
-    total_comments_q1 = 0
-    total_comments_q2 = 0
-    total_shares_q1 = 0
-    total_shares_q2 = 0
-    total_impressions_q1 = 0
-    total_impressions_q2 = 0
-
-    # Calculate totals for Q1
-    if 'Q1' in data.get('data', {}):
-        for day in data['data']['Q1']:
-            metrics = day.get('metrics', {})
-            total_likes_q1 += metrics.get('likes', 0)
-            total_comments_q1 += metrics.get('comments_count', 0)
-            total_shares_q1 += metrics.get('shares_count', 0)
-            total_impressions_q1 += metrics.get('impressions', 0)
-
-    # Calculate totals for Q2
-    if 'Q2' in data.get('data', {}):
-        for day in data['data']['Q2']:
-            metrics = day.get('metrics', {})
-            total_likes_q2 += metrics.get('likes', 0)
-            total_comments_q2 += metrics.get('comments_count', 0)
-            total_shares_q2 += metrics.get('shares_count', 0)
-            total_impressions_q2 += metrics.get('impressions', 0)
+    # Each quarter is a list of Sprout daily rows or a MetricSeries
+    quarters = data.get('data', {})
+    q1 = quarter_totals(quarters.get('Q1'))
+    q2 = quarter_totals(quarters.get('Q2'))
+    total_likes_q1, total_likes_q2 = q1['likes'], q2['likes']
+    total_comments_q1, total_comments_q2 = q1['comments_count'], q2['comments_count']
+    total_shares_q1, total_shares_q2 = q1['shares_count'], q2['shares_count']
+    total_impressions_q1, total_impressions_q2 = q1['impressions'], q2['impressions']
 
     # Calculate changes
     likes_change = ((total_likes_q2 - total_likes_q1) / total_likes_q1 * 100) if total_likes_q1 > 0 else float('inf')
@@ -411,7 +653,7 @@ def analyze_data(data):
         "metrics_to_track": ["Overall Performance Score", "Content ROI", "Audience Growth Rate"]
     })
 
-    return json.dumps({"strategies": strategies}, indent=2)
+    return {"strategies": strategies}
 
 def generate_strategy(report_data, retry_count=0):
     try:
@@ -468,15 +710,26 @@ Focus on specific, measurable actions based on the performance data provided. En
 
         model_config = models[retry_count]
 
-        response = client.chat.completions.create(
-            model=model_config["name"],
-            messages=[
-                {"role": "system", "content": "You are a social media strategy expert. Always respond with valid JSON containing exactly 5 detailed, actionable strategies. Never include markdown formatting or code blocks in your response - only pure JSON."},
-                {"role": "user", "content": base_prompt}
-            ],
-            temperature=0.7,
-            max_tokens=model_config["max_tokens"]
-        )
+        with start_span('openai.generate_strategy', **{'gen_ai.request.model': model_config["name"],
+                                                         'gen_ai.request.max_tokens': model_config["max_tokens"],
+                                                         'retry_count': retry_count}) as span:
+            with upstream_call('openai', 'chat/completions'):
+                response = get_openai_client().chat.completions.create(
+                    model=model_config["name"],
+                    messages=[
+                        {"role": "system", "content": "You are a social media strategy expert. Always respond with valid JSON containing exactly 5 detailed, actionable strategies. Never include markdown formatting or code blocks in your response - only pure JSON."},
+                        {"role": "user", "content": base_prompt}
+                    ],
+                    temperature=0.7,
+                    max_tokens=model_config["max_tokens"]
+                )
+
+            if response.usage is not None:
+                OPENAI_TOKENS.inc(response.usage.prompt_tokens, model=model_config["name"], kind='prompt')
+                OPENAI_TOKENS.inc(response.usage.completion_tokens, model=model_config["name"], kind='completion')
+                if span is not None:
+                    span.set_attribute('gen_ai.usage.input_tokens', response.usage.prompt_tokens)
+                    span.set_attribute('gen_ai.usage.output_tokens', response.usage.completion_tokens)
 
         strategy_response = response.choices[0].message.content.strip()
 
@@ -488,20 +741,19 @@ Focus on specific, measurable actions based on the performance data provided. En
                 if strategy_response.startswith('json'):
                     strategy_response = strategy_response[4:]
 
-            parsed_json = json.loads(strategy_response)
-            return json.dumps(parsed_json, indent=2)
+            return loads(strategy_response)
         except json.JSONDecodeError:
             # Fallback to text parsing if JSON parsing fails
             return parse_text_strategies_to_json(strategy_response)
 
     except Exception as e:
-        print(f"OpenAI API error: {str(e)}")
+        logger.warning("OpenAI API error", extra={'error': str(e), 'retry_count': retry_count})
         if "insufficient_quota" in str(e) and retry_count < len(models) - 1:
             return generate_strategy(report_data, retry_count + 1)
         return generate_fallback_strategies(report_data)
 
 def parse_text_strategies_to_json(text_response):
-    """Parse text-based strategy response into structured JSON format"""
+    """Parse text-based strategy response into a structured strategies dict"""
     strategies = []
     lines = text_response.split('\n')
     current_strategy = None
@@ -558,7 +810,7 @@ def parse_text_strategies_to_json(text_response):
             "metrics_to_track": ["Engagement Rate", "Reach"]
         })
 
-    return json.dumps({"strategies": strategies[:5]}, indent=2)
+    return {"strategies": strategies[:5]}
 
 def generate_fallback_strategies(report_data):
     """Generate fallback strategies when AI fails"""
@@ -642,29 +894,27 @@ def generate_fallback_strategies(report_data):
         }
     ]
 
-    return json.dumps({"strategies": fallback_strategies}, indent=2)
+    return {"strategies": fallback_strategies}
 
 def check_api_status():
     """Check OpenAI API key status"""
     try:
         # Test API with minimal tokens
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "user", "content": "Hi"}
-            ],
-            max_tokens=1
-        )
-        print("✅ API key is working")
+        with upstream_call('openai', 'chat/completions'):
+            response = get_openai_client().chat.completions.create(
+                model="gpt-3.5-turbo",
+                messages=[
+                    {"role": "user", "content": "Hi"}
+                ],
+                max_tokens=1
+            )
+        logger.info("OpenAI API key is working")
         return True
     except Exception as e:
-        print("❌ API key status check failed:")
-        print(f"Error: {str(e)}")
+        logger.error("OpenAI API key status check failed", extra={'error': str(e)})
         if "insufficient_quota" in str(e):
-            print("\nTo fix this:")
-            print("1. Visit https://platform.openai.com/account/billing")
-            print("2. Add payment method")
-            print("3. Ensure you have available credits")
+            logger.error("OpenAI quota exhausted: add a payment method and credits at "
+                         "https://platform.openai.com/account/billing")
         return False
 
 def rate_limit_check():
@@ -679,13 +929,14 @@ def rate_limit_check():
     
     if len(rate_limit_check.calls) >= 3:  # Free tier limit
         sleep_time = 60 - (now - rate_limit_check.calls[0]).seconds
-        print(f"Rate limit reached. Waiting {sleep_time} seconds...")
+        logger.warning("Rate limit reached", extra={'sleep_seconds': sleep_time})
         time.sleep(sleep_time)
         rate_limit_check.calls = []
     
     rate_limit_check.calls.append(now)
 
 if __name__ == "__main__":
+    configure_logging()
     try:
         if not check_api_status():
             raise Exception("API key validation failed")
@@ -701,8 +952,8 @@ if __name__ == "__main__":
 
         # Fetch stats for both quarters
         print("Fetching stats...")
-        stats_current = get_profile_stats(profile_id, current_quarter_start, current_quarter_end)
-        stats_last = get_profile_stats(profile_id, last_quarter_start, last_quarter_end)
+        stats_current = get_profile_stats(profile_id, current_quarter_start, current_quarter_end).totals()
+        stats_last = get_profile_stats(profile_id, last_quarter_start, last_quarter_end).totals()
 
         # Compare quarters
         print("\nQuarter-to-Quarter Comparison:")
@@ -714,7 +965,7 @@ if __name__ == "__main__":
         report_summary = f"Quarter-to-quarter comparison shows the following changes: {json.dumps(comparison)}"
         strategy = generate_strategy(report_summary)
         print("\nStrategy for Next Quarter:")
-        print(strategy)
+        print(json.dumps(strategy, indent=2))
 
     except Exception as e:
         print(f"Error: {str(e)}")
@@ -0,0 +1,343 @@
+"""
+Memory-mapped daily metrics for hot profiles. Each profile's most recently
+requested span of days is one fixed-width file:
+
+    header | metric names | days (int32) | one int64/float64 column per metric | rollups | prefix sums
+
+Every worker maps the same files read-only, so they share one copy in the page
+cache, and a stats read is a binary search plus views on the mapped columns:
+nothing is parsed or copied. Files are replaced atomically; a reader notices
+the new inode on its next lookup and remaps.
+
+The file also holds the profile's calendar week, month, quarter and year
+rollups (timeseries.Rollups), recomputed on a put only for the periods its
+days fall in, and prefix sums over every day of the span
+(timeseries.PrefixSums). A read of exactly one calendar period takes its
+totals from the rollups and any other range from the prefix sums, so totals
+never sum the daily columns. A refresh that only replaces the tail of the
+span extends the prefix sums instead of rebuilding them, and read versions
+are content hashes of the range (via per-day fingerprints), so they change
+only when a day inside the range does.
+
+Days newer than settle_days before the fetch are only served for ttl seconds
+after it, like the stats cache; older days are served until the file is evicted.
+"""
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+from datetime import date
+
+import numpy as np
+
+from cache import CacheEntry
+from instrumentation import CACHE_REQUESTS
+from timeseries import (GRANULARITIES, MetricSeries, PrefixSums, Rollups, calendar_period, day_fingerprints,
+                        to_ordinal)
+from tracer import start_span
+
+MAGIC = b'SMMS'
+FORMAT_VERSION = 4
+HEADER = np.dtype([
+    ('magic', 'S4'), ('format', '<u4'), ('fetched_at', '<f8'),
+    ('first_day', '<i4'), ('last_day', '<i4'), ('count', '<u4'), ('n_metrics', '<u4'),
+    ('periods', '<u4', (len(GRANULARITIES),))
+])
+METRIC = np.dtype([('name', 'S31'), ('kind', 'S1')])
+_PROFILE_ID = re.compile(r'^[A-Za-z0-9_-]+$')
+
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+
+def _kind(column):
+    return '<i8' if column.dtype.kind in 'iu' else '<f8'
+
+
+class _Mapping:
+    """One mapped profile file and the views into it"""
+
+    __slots__ = ('stat', 'fetched_at', 'first_day', 'last_day', 'days', 'columns', 'rollups', 'prefix')
+
+    def __init__(self, path, stat):
+        raw = np.memmap(path, dtype=np.uint8, mode='r')
+        header = raw[:HEADER.itemsize].view(HEADER)[0]
+        if header['magic'] != MAGIC or header['format'] != FORMAT_VERSION:
+            raise ValueError(f"Not a metric store file: {path}")
+        offset = HEADER.itemsize
+
+        def take(dtype, count):
+            nonlocal offset
+            dtype = np.dtype(dtype)
+            offset = _align(offset)
+            array = raw[offset:offset + dtype.itemsize * count].view(dtype)
+            offset += dtype.itemsize * count
+            return array
+
+        count = int(header['count'])
+        metrics = [(metric['name'].decode(), '<i8' if metric['kind'] == b'i' else '<f8')
+                   for metric in take(METRIC, int(header['n_metrics']))]
+        self.stat = stat
+        self.fetched_at = float(header['fetched_at'])
+        self.first_day = int(header['first_day'])
+        self.last_day = int(header['last_day'])
+        self.days = take('<i4', count)
+        self.columns = {name: take(kind, count) for name, kind in metrics}
+        periods = {}
+        for granularity, n in zip(GRANULARITIES, header['periods'].tolist()):
+            periods[granularity] = (take('<i4', n), take('<i4', n), {name: take(kind, n) for name, kind in metrics})
+        self.rollups = Rollups(periods)
+        span = self.last_day - self.first_day + 2
+        self.prefix = PrefixSums(self.first_day, take('<i4', span), {name: take(kind, span) for name, kind in metrics},
+                                 take('<u8', span))
+
+    def series(self, profile_id):
+        return MetricSeries(profile_id, self.days, self.columns)
+
+
+def _encode(series, rollups, prefix, fetched_at, first_day, last_day):
+    header = np.zeros(1, dtype=HEADER)
+    header[0] = (MAGIC, FORMAT_VERSION, fetched_at, first_day, last_day, len(series),
+                 len(series.columns), [len(rollups.periods[granularity][0]) for granularity in GRANULARITIES])
+    metrics = np.array([(metric.encode(), b'i' if _kind(column) == '<i8' else b'f')
+                        for metric, column in series.columns.items()], dtype=METRIC)
+    parts = []
+    offset = 0
+
+    def put(data):
+        nonlocal offset
+        parts.append(b'\0' * (_align(offset) - offset))
+        parts.append(data)
+        offset = _align(offset) + len(data)
+
+    put(header.tobytes())
+    put(metrics.tobytes())
+    put(series.days.astype('<i4').tobytes())
+    for column in series.columns.values():
+        put(column.astype(_kind(column)).tobytes())
+    for granularity in GRANULARITIES:
+        starts, counts, columns = rollups.periods[granularity]
+        put(starts.astype('<i4').tobytes())
+        put(counts.astype('<i4').tobytes())
+        for metric, column in series.columns.items():
+            put(columns[metric].astype(_kind(column)).tobytes())
+    put(prefix.present.astype('<i4').tobytes())
+    for metric, column in series.columns.items():
+        put(prefix.sums[metric].astype(_kind(column)).tobytes())
+    put(prefix.fingerprints.astype('<u8').tobytes())
+    return b''.join(parts)
+
+
+def _changed_days(stored, series, start, end, first, last):
+    """(first, last) ordinals of days a merge adds, removes or changes, or None"""
+    old = stored.days
+    old_in_range = (old >= max(start, first)) & (old <= min(end, last))
+    old_fingerprints = day_fingerprints(stored)[old_in_range]
+    new_fingerprints = day_fingerprints(series)
+    changed = np.concatenate([
+        old[old_in_range][~np.isin(old_fingerprints, new_fingerprints)],
+        series.days[~np.isin(new_fingerprints, old_fingerprints)],
+        # Stale days past the kept span are dropped or replaced
+        old[old > last]
+    ])
+    if not len(changed):
+        return None
+    return int(changed.min()), int(changed.max())
+
+
+class MetricStore:
+    """Directory of memory-mapped profile series, bounded to max_profiles files"""
+
+    def __init__(self, root, ttl=900, settle_days=3, max_profiles=256):
+        self.root = root
+        self.ttl = ttl
+        self.settle_days = settle_days
+        self.max_profiles = max_profiles
+        self._mappings = {}
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, profile_id):
+        return os.path.join(self.root, f'{profile_id}.metrics')
+
+    def _mapping(self, profile_id):
+        """Current mapping for the profile, remapping when the file was replaced"""
+        path = self._path(profile_id)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            self._mappings.pop(profile_id, None)
+            return None
+        key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        mapping = self._mappings.get(profile_id)
+        if mapping is None or mapping.stat != key:
+            try:
+                mapping = self._mappings[profile_id] = _Mapping(path, key)
+            except ValueError:
+                # Written by another format version; treated as absent until replaced
+                return None
+        return mapping
+
+    def _settled_until(self, fetched_at):
+        return date.fromtimestamp(fetched_at).toordinal() - self.settle_days
+
+    @staticmethod
+    def accepts(profile_id):
+        """IDs become file names, so only plain identifiers are stored"""
+        return bool(_PROFILE_ID.match(str(profile_id)))
+
+    def _lookup(self, profile_id, start, end):
+        """Mapping holding every day from start to end that is still fresh, or None"""
+        if not self.accepts(profile_id):
+            return None
+        with start_span('metric_store.get') as span:
+            mapping = self._mapping(profile_id)
+            hit = mapping is not None and mapping.first_day <= start and end <= mapping.last_day
+            if hit and end > self._settled_until(mapping.fetched_at):
+                hit = time.time() < mapping.fetched_at + self.ttl
+            if span is not None:
+                span.set_attribute('cache.hit', hit)
+        CACHE_REQUESTS.inc(cache='metric_store', result='hit' if hit else 'miss')
+        return mapping if hit else None
+
+    @staticmethod
+    def _totals(mapping, start, end, metrics=None):
+        period = calendar_period(date.fromordinal(start), date.fromordinal(end))
+        if period is not None:
+            rollup = mapping.rollups.lookup(*period)
+            if rollup is not None:
+                days, totals = rollup
+                return days, {metric: totals.get(metric, 0) for metric in (metrics or totals)}
+        return mapping.prefix.range_totals(start, end, metrics)
+
+    def get(self, profile_id, start_date, end_date):
+        """CacheEntry whose value is MetricSeries.to_dict() over the mapped columns, or None"""
+        start, end = to_ordinal(start_date), to_ordinal(end_date)
+        mapping = self._lookup(profile_id, start, end)
+        if mapping is None:
+            return None
+        series = mapping.series(profile_id).between(start_date, end_date)
+        series.known_totals = self._totals(mapping, start, end)[1]
+        # Content-addressed, so the version only changes when a day in the range does
+        fingerprint = mapping.prefix.fingerprint(start, end)
+        version = hashlib.blake2b(f'{start}:{end}:{len(series)}:{fingerprint}'.encode(), digest_size=12).hexdigest()
+        return CacheEntry(series.to_dict(), version, mapping.fetched_at + self.ttl)
+
+    def range_totals(self, profile_id, start_date, end_date, metrics=None):
+        """(days with data, {metric: total}) for the range in constant time, or None when not stored"""
+        start, end = to_ordinal(start_date), to_ordinal(end_date)
+        mapping = self._lookup(profile_id, start, end)
+        if mapping is None:
+            return None
+        return self._totals(mapping, start, end, metrics)
+
+    def refresh_start(self, profile_id, start_date, end_date):
+        """
+        First day of start_date..end_date that has to come from Sprout. The days
+        before it are stored and settled, so refreshing a range that runs up to
+        today only fetches the unsettled tail and the days added since.
+        """
+        start = to_ordinal(start_date)
+        mapping = self._mapping(profile_id) if self.accepts(profile_id) else None
+        if mapping is None or mapping.first_day > start:
+            return start_date
+        reusable = min(mapping.last_day, self._settled_until(mapping.fetched_at))
+        if reusable < start:
+            return start_date
+        return date.fromordinal(min(reusable + 1, to_ordinal(end_date))).isoformat()
+
+    def put(self, profile_id, series, start_date, end_date):
+        """
+        Store a series fetched for start_date..end_date. When it overlaps or
+        adjoins the stored span the two are merged, newer values winning;
+        otherwise it replaces the stored span. Rollups are only recomputed for
+        the periods the new days touch, and when the new days replace the tail
+        of the span (a refresh) the prefix sums are extended from the last
+        unchanged day, so the aggregation work grows with the new days only.
+
+        Returns (first, last) ordinals bounding the days whose stored values
+        changed, or None when none did.
+        """
+        if not self.accepts(profile_id):
+            return None
+        start, end = to_ordinal(start_date), to_ordinal(end_date)
+        series = series.between(start_date, end_date)
+        now = time.time()
+        with self._lock, start_span('metric_store.put') as span:
+            fetched_at = now
+            current = self._mapping(profile_id)
+            merge = False
+            if current is not None and list(current.columns) == series.metrics:
+                first, last = current.first_day, current.last_day
+                if now >= current.fetched_at + self.ttl:
+                    # Stale unsettled days are dropped rather than kept alongside fresh ones
+                    last = min(last, self._settled_until(current.fetched_at))
+                merge = first <= end + 1 and start <= last + 1
+
+            if not merge:
+                changed = (int(series.days[0]), int(series.days[-1])) if len(series) else None
+                rollups = Rollups.from_series(series)
+                prefix = PrefixSums.from_series(series, start, end)
+            else:
+                stored = current.series(profile_id)
+                changed = _changed_days(stored, series, start, end, first, last)
+                keep = ((stored.days >= first) & (stored.days <= last)
+                        & ((stored.days < start) | (stored.days > end)))
+                series = MetricSeries.concat([
+                    MetricSeries(profile_id, stored.days[keep],
+                                 {metric: column[keep] for metric, column in stored.columns.items()}),
+                    series
+                ])
+                if last > max(end, self._settled_until(now)):
+                    fetched_at = current.fetched_at
+                incremental = first <= start and end >= last
+                if incremental:
+                    prefix = current.prefix.extended(series.between(start_date, end_date), start, end)
+                else:
+                    prefix = PrefixSums.from_series(series, min(first, start), max(last, end))
+                # Periods touching the new days or a dropped stale tail are recomputed from the prefix sums
+                rollups = current.rollups.updated(prefix, start, max(end, current.last_day))
+                start, end = min(first, start), max(last, end)
+                if span is not None:
+                    span.set_attribute('metric_store.incremental', incremental)
+            self._write(profile_id, _encode(series, rollups, prefix, fetched_at, start, end))
+            self._evict()
+        return changed
+
+    def _write(self, profile_id, data):
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix='.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(profile_id))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def _evict(self):
+        """Delete the least recently written files beyond max_profiles"""
+        files = []
+        for entry in os.scandir(self.root):
+            if entry.name.endswith('.metrics'):
+                files.append((entry.stat().st_mtime, entry.path))
+        for _, path in sorted(files)[:max(0, len(files) - self.max_profiles)]:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+    def close(self):
+        """Drop this process's mappings; the pages are unmapped once no views remain"""
+        self._mappings.clear()
+
+
+def create_metric_store(ttl=900):
+    """MetricStore at METRIC_STORE_PATH, or None when it is disabled"""
+    path = os.environ.get('METRIC_STORE_PATH')
+    if not path:
+        return None
+    return MetricStore(path, ttl=ttl, settle_days=int(os.environ.get('WAREHOUSE_SETTLE_DAYS', 3)),
+                       max_profiles=int(os.environ.get('METRIC_STORE_MAX_PROFILES', 256)))
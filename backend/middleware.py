@@ -0,0 +1,403 @@
+import asyncio
+import hmac
+import math
+import time
+from collections import deque
+import uuid
+import zlib
+
+import anyio.to_thread
+from starlette.datastructures import Headers, MutableHeaders
+
+from instrumentation import REQUEST_LATENCY, REQUESTS_IN_FLIGHT, REQUESTS_SHED
+from tracer import SPAN_KIND_SERVER, STATUS_ERROR, TRACER
+from profiler import StackSampler
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+# Bodies above this size are compressed in a worker thread so the event loop stays free
+THREAD_MINIMUM_SIZE = 128 * 1024
+
+
+def _accepted_encodings(accept_encoding):
+    """Encodings from an Accept-Encoding header that are not refused with q=0"""
+    accepted = set()
+    for part in accept_encoding.lower().split(','):
+        coding, _, params = part.strip().partition(';')
+        quality = params.strip()
+        if quality.startswith('q='):
+            try:
+                if float(quality[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding.strip())
+    return accepted
+
+
+def encoded_etag(etag, coding):
+    """
+    ETag of a body encoded with coding. A strong validator must differ for
+    every byte representation, so the coding is appended inside the quotes;
+    weak tags already only promise equivalent content and are kept.
+    """
+    if etag.startswith('W/') or not etag.endswith('"'):
+        return etag
+    return f'{etag[:-1]}-{coding}"'
+
+
+class _GzipEncoder:
+    name = 'gzip'
+
+    def __init__(self, level):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, body, more_body):
+        data = self._compressor.compress(body)
+        return data + self._compressor.flush(zlib.Z_SYNC_FLUSH if more_body else zlib.Z_FINISH)
+
+
+class _BrotliEncoder:
+    name = 'br'
+
+    def __init__(self, quality):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, body, more_body):
+        data = self._compressor.process(body)
+        return data + (self._compressor.flush() if more_body else self._compressor.finish())
+
+
+class CompressionMiddleware:
+    """
+    Brotli (when installed and accepted) or gzip compression for responses
+    of at least minimum_size bytes. Streaming responses are compressed chunk
+    by chunk with a flush after each one, so NDJSON streams stay incremental.
+    A strong ETag on an encoded response gets the coding appended (see
+    encoded_etag), so each encoding has its own validator.
+    """
+
+    def __init__(self, app, minimum_size=1024, gzip_level=6, brotli_quality=4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def _make_encoder(self, scope):
+        accepted = _accepted_encodings(Headers(scope=scope).get('accept-encoding', ''))
+        if brotli is not None and 'br' in accepted:
+            return _BrotliEncoder(self.brotli_quality)
+        if 'gzip' in accepted:
+            return _GzipEncoder(self.gzip_level)
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        encoder = self._make_encoder(scope)
+        if encoder is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        passthrough = False
+        started = False
+
+        async def compress(body, more_body):
+            if len(body) >= THREAD_MINIMUM_SIZE:
+                return await anyio.to_thread.run_sync(encoder.compress, body, more_body)
+            return encoder.compress(body, more_body)
+
+        async def send_compressed(message):
+            nonlocal start_message, passthrough, started
+
+            if message['type'] == 'http.response.start':
+                headers = Headers(raw=message['headers'])
+                passthrough = (
+                    'content-encoding' in headers
+                    or message['status'] in (204, 206, 304)
+                    or headers.get('content-type', '').startswith('text/event-stream')
+                )
+                if passthrough:
+                    await send(message)
+                else:
+                    start_message = message
+                return
+
+            if passthrough or message['type'] != 'http.response.body':
+                await send(message)
+                return
+
+            body = message.get('body', b'')
+            more_body = message.get('more_body', False)
+
+            if not started:
+                started = True
+                headers = MutableHeaders(raw=start_message['headers'])
+                headers.add_vary_header('Accept-Encoding')
+                if not more_body and len(body) < self.minimum_size:
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+                headers['Content-Encoding'] = encoder.name
+                if 'etag' in headers:
+                    headers['ETag'] = encoded_etag(headers['etag'], encoder.name)
+                if more_body:
+                    del headers['Content-Length']
+                message['body'] = await compress(body, more_body)
+                if not more_body:
+                    headers['Content-Length'] = str(len(message['body']))
+                await send(start_message)
+                await send(message)
+                return
+
+            message['body'] = await compress(body, more_body)
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
+
+
+def route_name(scope):
+    """Route template (e.g. /jobs/{job_id}) once routing has run, so labels stay bounded"""
+    route = scope.get('route')
+    return getattr(route, 'path', None) or 'unmatched'
+
+
+class MetricsMiddleware:
+    """Per-endpoint request latency histogram and in-flight gauge"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            REQUEST_LATENCY.observe(time.perf_counter() - start, method=scope['method'],
+                                    endpoint=route_name(scope), status=status)
+
+
+class TracingMiddleware:
+    """
+    Server span around each request, continuing the caller's trace when a
+    traceparent header is sent. The span is renamed to the route template
+    once routing has run.
+    """
+
+    def __init__(self, app, tracer=TRACER):
+        self.app = app
+        self.tracer = tracer
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not self.tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        with self.tracer.start_span(scope['method'], kind=SPAN_KIND_SERVER, traceparent=headers.get('traceparent'),
+                                    **{'http.method': scope['method'], 'url.path': scope['path']}) as span:
+            if span is None:
+                await self.app(scope, receive, send)
+                return
+
+            async def send_with_status(message):
+                if message['type'] == 'http.response.start':
+                    span.set_attribute('http.status_code', message['status'])
+                    if message['status'] >= 500:
+                        span.status = STATUS_ERROR
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                route = route_name(scope)
+                span.name = f"{scope['method']} {route}"
+                span.set_attribute('http.route', route)
+
+
+def admin_authorized(admin_token, provided):
+    """True when admin access is configured and provided matches it"""
+    return bool(admin_token) and bool(provided) and hmac.compare_digest(admin_token, provided)
+
+
+class ProfilingMiddleware:
+    """
+    Opt-in profile of a single request: send X-Profile: 1 with a valid
+    X-Admin-Token and the process is sampled while the request runs. The
+    response carries X-Profile-Id; the collapsed stacks are kept under
+    "profile:<id>" in the cache get_store() returns, looked up per request
+    so the cache can be created at startup. Every thread is sampled, so
+    under load other requests show up alongside the profiled one.
+    """
+
+    def __init__(self, app, admin_token, get_store, max_concurrent=2):
+        self.app = app
+        self.admin_token = admin_token
+        self.get_store = get_store
+        self.max_concurrent = max_concurrent
+        self._active = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not self.admin_token:
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        if (headers.get('x-profile') != '1' or self._active >= self.max_concurrent
+                or not admin_authorized(self.admin_token, headers.get('x-admin-token'))):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = uuid.uuid4().hex
+
+        async def send_with_id(message):
+            if message['type'] == 'http.response.start':
+                MutableHeaders(scope=message)['X-Profile-Id'] = profile_id
+            await send(message)
+
+        self._active += 1
+        sampler = StackSampler().start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            self._active -= 1
+            await anyio.to_thread.run_sync(sampler.stop)
+            await anyio.to_thread.run_sync(self.get_store().set, f'profile:{profile_id}', {
+                'id': profile_id,
+                'method': scope['method'],
+                'path': scope['path'],
+                'duration': round(sampler.duration, 4),
+                'samples': sampler.sample_count,
+                'collapsed': sampler.collapsed()
+            })
+
+
+class AdmissionPolicy:
+    """
+    Concurrency limit for a group of endpoints. At most limit requests run at
+    once and at most max_queue wait, each for up to max_wait seconds. Lower
+    priority numbers are more important: a policy sheds its requests while
+    any more important policy has requests waiting.
+    """
+
+    def __init__(self, name, paths, limit, max_queue, max_wait=10.0, priority=0):
+        self.name = name
+        self.paths = tuple(paths)
+        self.limit = limit
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.priority = priority
+        self.active = 0
+        self._waiters = deque()
+
+    @property
+    def waiting(self):
+        return len(self._waiters)
+
+    async def acquire(self):
+        """Take a slot, waiting if needed; returns a shed reason instead when none is free"""
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return None
+        if len(self._waiters) >= self.max_queue:
+            return 'queue_full'
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.max_wait)
+        except asyncio.TimeoutError:
+            if waiter.done():
+                return None
+            self._waiters.remove(waiter)
+            waiter.cancel()
+            return 'timeout'
+        except asyncio.CancelledError:
+            if waiter.done():
+                self.release()
+            else:
+                self._waiters.remove(waiter)
+                waiter.cancel()
+            raise
+        return None
+
+    def release(self):
+        # Hand the slot straight to the next waiter so active never drops below the queue
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+
+class AdmissionControlMiddleware:
+    """
+    Sheds load before it reaches the threadpool: requests over an endpoint's
+    concurrency and queue limits are answered at once with 429 (queue full)
+    or 503 (waited too long, or shed for a more important endpoint), both
+    with Retry-After. Paths without a policy are never limited.
+    """
+
+    def __init__(self, app, policies, retry_after=1):
+        self.app = app
+        self.policies = sorted(policies, key=lambda policy: policy.priority)
+        self.retry_after = retry_after
+        self._by_path = {path: policy for policy in self.policies for path in policy.paths}
+
+    def _shed_for_priority(self, policy):
+        return any(other.waiting for other in self.policies if other.priority < policy.priority)
+
+    async def _reject(self, send, policy, reason):
+        REQUESTS_SHED.inc(policy=policy.name, reason=reason)
+        status = 429 if reason == 'queue_full' else 503
+        retry_after = max(self.retry_after, math.ceil(policy.max_wait / 2)) if reason == 'timeout' else self.retry_after
+        body = b'{"detail":"Server is busy, retry later"}'
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [
+                (b'content-type', b'application/json'),
+                (b'content-length', str(len(body)).encode()),
+                (b'retry-after', str(retry_after).encode())
+            ]
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def __call__(self, scope, receive, send):
+        policy = self._by_path.get(scope['path']) if scope['type'] == 'http' else None
+        if policy is None or scope['method'] == 'OPTIONS':
+            await self.app(scope, receive, send)
+            return
+
+        if self._shed_for_priority(policy):
+            await self._reject(send, policy, 'priority')
+            return
+        reason = await policy.acquire()
+        if reason is not None:
+            await self._reject(send, policy, reason)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            policy.release()
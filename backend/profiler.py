@@ -0,0 +1,94 @@
+"""
+Sampling profiler for the live API server. A background thread snapshots
+every thread's stack at a fixed interval and counts identical stacks; the
+result is rendered in the collapsed-stack format read by flamegraph.pl,
+speedscope and inferno.
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+# Frames where a thread is parked waiting for work rather than running it
+IDLE_LEAVES = {
+    ('threading.py', 'wait'),
+    ('selectors.py', 'select'),
+    ('handlers.py', 'dequeue'),
+    ('thread.py', '_worker'),
+}
+
+MAX_PROFILE_SECONDS = 60
+DEFAULT_INTERVAL = 0.005
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    # ';' separates frames in the collapsed format, so it cannot appear in a label
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(';', ':')
+
+
+class StackSampler:
+    """
+    Samples thread stacks from start() until stop(). Idle threads (parked in
+    a wait or select) are skipped unless include_idle is set.
+    """
+
+    def __init__(self, interval=DEFAULT_INTERVAL, include_idle=False):
+        self.interval = interval
+        self.include_idle = include_idle
+        self.samples = Counter()
+        self.sample_count = 0
+        self.started_at = None
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self, own_ident):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            if not self.include_idle:
+                code = frame.f_code
+                if (os.path.basename(code.co_filename), code.co_name) in IDLE_LEAVES:
+                    continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            stack.append(names.get(ident, f'thread-{ident}').replace(';', ':'))
+            self.samples[';'.join(reversed(stack))] += 1
+        self.sample_count += 1
+
+    def _run(self):
+        own_ident = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            self._sample(own_ident)
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self.started_at
+        return self
+
+    def collapsed(self):
+        """One 'frame;frame;frame count' line per distinct stack, hottest first"""
+        return ''.join(f'{stack} {count}\n' for stack, count in self.samples.most_common())
+
+
+def profile_for(seconds, interval=DEFAULT_INTERVAL, include_idle=False):
+    """Sample the whole process for seconds (capped at MAX_PROFILE_SECONDS)"""
+    sampler = StackSampler(interval, include_idle).start()
+    try:
+        # An Event wait rather than sleep, so this thread is dropped as idle
+        threading.Event().wait(min(seconds, MAX_PROFILE_SECONDS))
+    finally:
+        sampler.stop()
+    return sampler
@@ -0,0 +1,31 @@
+import orjson
+from fastapi.responses import JSONResponse
+
+# NumPy arrays (e.g. comparison tensors) and non-string dict keys are
+# serialized natively instead of being converted in Python first
+DUMPS_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def dumps(obj):
+    """Serialize obj to compact UTF-8 JSON bytes"""
+    return orjson.dumps(obj, option=DUMPS_OPTIONS)
+
+
+def loads(data):
+    """Parse JSON from str or bytes; raises json.JSONDecodeError on bad input"""
+    return orjson.loads(data)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered by orjson in a single pass"""
+
+    def render(self, content):
+        return dumps(content)
+
+
+def json_response(content, status_code=200, headers=None):
+    """
+    Wrap an endpoint result in a FastJSONResponse. Returning a Response
+    directly skips FastAPI's jsonable_encoder walk over the whole payload.
+    """
+    return FastJSONResponse(content, status_code=status_code, headers=headers)
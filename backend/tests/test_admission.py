@@ -0,0 +1,163 @@
+import asyncio
+
+from middleware import AdmissionControlMiddleware, AdmissionPolicy
+
+
+class HeldApp:
+    """ASGI app that records the order requests reach it and holds each one until released"""
+
+    def __init__(self):
+        self.entered = []
+        self._releases = {}
+
+    async def __call__(self, scope, receive, send):
+        name = scope['name']
+        self._releases[name] = asyncio.Event()
+        self.entered.append(name)
+        await self._releases[name].wait()
+        await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+        await send({'type': 'http.response.body', 'body': b'ok'})
+
+    def release(self, name):
+        self._releases[name].set()
+
+
+async def request(middleware, name, path='/stats'):
+    """Status and headers of one request through middleware"""
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    async def receive():
+        return {'type': 'http.request'}
+
+    scope = {'type': 'http', 'method': 'GET', 'path': path, 'name': name}
+    await middleware(scope, receive, send)
+    return messages[0]['status'], dict(messages[0]['headers'])
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def stats_policy(**options):
+    return AdmissionPolicy('stats', ('/stats',), **{'limit': 1, 'max_queue': 1, 'max_wait': 5, **options})
+
+
+def test_requests_over_the_limit_queue_then_get_429():
+    async def scenario():
+        app = HeldApp()
+        policy = stats_policy()
+        middleware = AdmissionControlMiddleware(app, [policy])
+        running = asyncio.create_task(request(middleware, 'running'))
+        queued = asyncio.create_task(request(middleware, 'queued'))
+        await settle()
+        assert (policy.active, policy.waiting) == (1, 1)
+
+        status, headers = await request(middleware, 'rejected')
+        assert status == 429
+        assert headers[b'retry-after'] == b'1'
+        assert app.entered == ['running']
+
+        app.release('running')
+        assert (await running)[0] == 200
+        await settle()
+        assert app.entered == ['running', 'queued']
+        app.release('queued')
+        assert (await queued)[0] == 200
+        assert (policy.active, policy.waiting) == (0, 0)
+
+    asyncio.run(scenario())
+
+
+def test_requests_waiting_past_max_wait_get_503():
+    async def scenario():
+        app = HeldApp()
+        policy = stats_policy(max_wait=0.05)
+        middleware = AdmissionControlMiddleware(app, [policy], retry_after=2)
+        running = asyncio.create_task(request(middleware, 'running'))
+        await settle()
+
+        status, headers = await request(middleware, 'waited')
+        assert status == 503
+        assert headers[b'retry-after'] == b'2'
+        assert (policy.active, policy.waiting) == (1, 0)
+
+        app.release('running')
+        await running
+        assert policy.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_slots_go_to_waiters_in_arrival_order():
+    async def scenario():
+        app = HeldApp()
+        policy = stats_policy(max_queue=3)
+        middleware = AdmissionControlMiddleware(app, [policy])
+        tasks = []
+        for name in ('first', 'second', 'third', 'fourth'):
+            tasks.append(asyncio.create_task(request(middleware, name)))
+            await settle()
+        # Each release hands the slot to the request that has waited longest
+        for name in ('first', 'second', 'third'):
+            app.release(name)
+            await settle()
+        app.release('fourth')
+        await asyncio.gather(*tasks)
+        assert app.entered == ['first', 'second', 'third', 'fourth']
+        assert (policy.active, policy.waiting) == (0, 0)
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiters_do_not_leak_slots():
+    async def scenario():
+        app = HeldApp()
+        policy = stats_policy(max_queue=2)
+        middleware = AdmissionControlMiddleware(app, [policy])
+        running = asyncio.create_task(request(middleware, 'running'))
+        waiting = asyncio.create_task(request(middleware, 'waiting'))
+        await settle()
+
+        # Cancelled while still queued: it just leaves the queue
+        waiting.cancel()
+        await settle()
+        assert waiting.cancelled()
+        assert (policy.active, policy.waiting) == (1, 0)
+
+        app.release('running')
+        await running
+        assert policy.active == 0
+        after = asyncio.create_task(request(middleware, 'after'))
+        await settle()
+        assert app.entered == ['running', 'after']
+        app.release('after')
+        await after
+
+    asyncio.run(scenario())
+
+
+def test_waiter_cancelled_after_being_handed_a_slot_releases_it():
+    async def scenario():
+        policy = stats_policy()
+        assert await policy.acquire() is None
+        waiter = asyncio.create_task(policy.acquire())
+        await settle()
+        # The slot is handed over, then the waiter is cancelled before it resumes
+        policy.release()
+        waiter.cancel()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            pass
+        else:
+            # Before Python 3.12 wait_for may swallow the cancellation; the waiter then owns the slot
+            policy.release()
+        assert (policy.active, policy.waiting) == (0, 0)
+        assert await policy.acquire() is None
+        assert policy.active == 1
+
+    asyncio.run(scenario())
@@ -0,0 +1,47 @@
+import pytest
+
+from analytics import compare_periods
+
+PERIODS = ['Jan', 'Feb..Mar', 'Q2']
+
+
+def compare(values, metrics=('likes',)):
+    """compare_periods over a {profile: [value per period]} dict of a single metric"""
+    tensor = [[[value] for value in per_period] for per_period in values.values()]
+    return compare_periods(tensor, list(values), PERIODS[:len(next(iter(values.values())))], list(metrics))
+
+
+def test_percent_change_from_a_zero_base_is_null():
+    result = compare({'a': [0, 50, 100]})
+    assert result['absolute_change'] == [[[50.0], [50.0]]]
+    assert result['percent_change'] == [[[None], [100.0]]]
+    assert result['percent_change_vs_first'] == [[[None], [None], [None]]]
+    assert result['growth_rate'] == [[None]]
+
+
+def test_ties_share_a_competition_rank():
+    result = compare({'a': [10, 5, 0], 'b': [20, 5, 0], 'c': [10, 7, 0], 'd': [5, 5, 0]})
+    assert [[ranks[0] for ranks in profile] for profile in result['ranks']] == [
+        [2, 2, 1],
+        [1, 2, 1],
+        [2, 1, 1],
+        [4, 2, 1],
+    ]
+
+
+def test_growth_rate_compounds_per_period_whatever_their_length():
+    # A month, two months and a quarter: growth is per step between periods, not per day
+    result = compare({'a': [100, 150, 225], 'b': [100, 50, 0]})
+    assert result['growth_rate'] == [[50.0], [-100.0]]
+    assert result['percent_change'] == [[[50.0], [50.0]], [[-50.0], [-100.0]]]
+
+
+def test_single_period_has_no_growth_rate():
+    result = compare({'a': [100]})
+    assert result['absolute_change'] == [[]]
+    assert result['growth_rate'] == [[None]]
+
+
+def test_tensor_shape_must_match_labels():
+    with pytest.raises(ValueError):
+        compare_periods([[[1, 2]]], ['a'], ['Jan'], ['likes'])
@@ -0,0 +1,118 @@
+import csv
+import io
+
+import pytest
+from fastapi.testclient import TestClient
+
+import api_server
+import main
+from benchmarks.synthetic import SyntheticDataset
+from cache import MemoryCache
+from serialization import loads
+from timeseries import MetricSeries
+
+STATS = {'profile_id': '1000', 'start_date': '2024-01-01', 'end_date': '2024-12-31', 'include_daily': 'true'}
+
+
+@pytest.fixture
+def client():
+    with TestClient(api_server.app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def cached_stats(monkeypatch):
+    """A year of daily stats for profile 1000, served from a private cache"""
+    cache = MemoryCache()
+    series = MetricSeries.from_rows(SyntheticDataset(1).daily_rows(1000, '2024-01-01', '2024-12-31'))
+    entry = cache.set('stats', series.to_dict())
+    monkeypatch.setattr(api_server, 'peek_profile_stats_entry', lambda *args: entry)
+    monkeypatch.setattr(api_server, 'get_profile_stats_entry', lambda *args: entry)
+    return entry
+
+
+def test_stats_etag_differs_per_encoding(client, cached_stats):
+    identity = client.get('/stats', params=STATS, headers={'Accept-Encoding': 'identity'})
+    gzip = client.get('/stats', params=STATS, headers={'Accept-Encoding': 'gzip'})
+    assert identity.status_code == gzip.status_code == 200
+    assert 'content-encoding' not in identity.headers
+    assert gzip.headers['content-encoding'] == 'gzip'
+    assert identity.headers['etag'] == f'"{cached_stats.version}-daily"'
+    assert gzip.headers['etag'] == f'"{cached_stats.version}-daily-gzip"'
+    assert identity.json() == gzip.json()
+
+
+@pytest.mark.parametrize('accept_encoding', ['gzip', 'identity'])
+def test_stats_revalidates_with_either_etag(client, cached_stats, accept_encoding):
+    for etag in (f'"{cached_stats.version}-daily-gzip"', f'"{cached_stats.version}-daily"'):
+        response = client.get('/stats', params=STATS,
+                              headers={'Accept-Encoding': accept_encoding, 'If-None-Match': etag})
+        assert response.status_code == 304
+        assert response.headers['etag'] == etag
+        assert response.content == b''
+
+
+def test_stats_stale_etag_gets_full_response(client, cached_stats):
+    response = client.get('/stats', params=STATS,
+                          headers={'Accept-Encoding': 'gzip', 'If-None-Match': '"stale-daily-gzip"'})
+    assert response.status_code == 200
+
+
+def test_compare_rejects_unknown_metrics(client, monkeypatch):
+    def fetch(*args):
+        raise AssertionError("fetched before validating metrics")
+
+    monkeypatch.setattr(api_server, 'get_range_totals', fetch)
+    response = client.post('/compare', json={
+        'profile_ids': ['1000'],
+        'periods': [{'start_date': '2024-01-01', 'end_date': '2024-01-31'}],
+        'metrics': ['likes', 'followers', 'views']
+    })
+    assert response.status_code == 400
+    assert "['followers', 'views']" in response.json()['detail']
+
+
+@pytest.fixture
+def failing_sprout(monkeypatch):
+    """Sprout serves profile 1000, then fails after the first page of profile 1001"""
+    dataset = SyntheticDataset(2)
+
+    def pages(profile_id, start_date, end_date):
+        yield {'data': dataset.daily_rows(int(profile_id), start_date, end_date)}
+        if profile_id == '1001':
+            raise RuntimeError("Sprout returned 502")
+
+    monkeypatch.setattr(api_server, 'peek_profile_stats_entry', lambda *args: None)
+    monkeypatch.setattr(api_server, 'iter_profile_stats_pages', pages)
+
+
+EXPORT = {'profile_ids': ['1000', '1001', '1002'], 'start_date': '2024-01-01', 'end_date': '2024-01-10'}
+
+
+def test_ndjson_export_ends_with_an_error_record(client, failing_sprout):
+    response = client.post('/export', json=EXPORT)
+    assert response.status_code == 200
+    assert response.text.endswith('\n')
+    lines = [loads(line) for line in response.text.splitlines()]
+    assert [row['profile_id'] for row in lines[:-1]] == [1000] * 10 + [1001] * 10
+    assert lines[-1] == {'type': 'error', 'profile_id': '1001', 'detail': "Sprout returned 502"}
+
+
+def test_csv_export_ends_with_an_error_row(client, failing_sprout):
+    response = client.post('/export', json={**EXPORT, 'format': 'csv'})
+    assert response.status_code == 200
+    rows = list(csv.reader(io.StringIO(response.text)))
+    assert rows[0] == api_server.EXPORT_COLUMNS
+    assert [row[0] for row in rows[1:-1]] == ['1000'] * 10 + ['1001'] * 10
+    assert rows[-1] == [api_server.EXPORT_CSV_ERROR_MARKER, '1001', "Sprout returned 502"]
+
+
+def test_stores_are_opened_by_the_lifespan_and_closed_after_it():
+    assert main.stats_cache is None
+    with TestClient(api_server.app) as test_client:
+        assert main.stats_cache is not None
+        response = test_client.post('/jobs', json={'type': 'missing', 'params': {}})
+        assert response.status_code == 400
+        assert "['stats', 'strategy']" in response.json()['detail']
+        assert test_client.get('/jobs/unknown').status_code == 404
+    assert main.stats_cache is None
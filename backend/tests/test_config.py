@@ -0,0 +1,38 @@
+import json
+
+import pytest
+
+import main
+
+
+@pytest.fixture
+def config_file(tmp_path, monkeypatch):
+    monkeypatch.delenv('SPROUT_API_KEY', raising=False)
+    monkeypatch.delenv('OPENAI_API_KEY', raising=False)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(main, '_config', None)
+    monkeypatch.setattr(main, '_config_expires', 0.0)
+    path = tmp_path / 'config.json'
+
+    def write(**keys):
+        path.write_text(json.dumps(keys))
+    return write
+
+
+def test_incomplete_config_is_reloaded_after_the_retry_interval(config_file, monkeypatch):
+    config_file(sprout_api_key='sprout-key-1234')
+    assert main.readiness() == {'sprout_api_key': True, 'openai_api_key': False}
+
+    config_file(sprout_api_key='sprout-key-1234', openai_api_key='openai-key-5678')
+    assert main.readiness()['openai_api_key'] is False
+    monkeypatch.setattr(main, 'CONFIG_RETRY_INTERVAL', 0)
+    monkeypatch.setattr(main, '_config_expires', 0.0)
+    assert main.readiness() == {'sprout_api_key': True, 'openai_api_key': True}
+
+
+def test_complete_config_is_kept(config_file, monkeypatch):
+    monkeypatch.setattr(main, 'CONFIG_RETRY_INTERVAL', 0)
+    config_file(sprout_api_key='sprout-key-1234', openai_api_key='openai-key-5678')
+    assert main.get_sprout_api_key() == 'sprout-key-1234'
+    config_file(sprout_api_key='other-key-0000', openai_api_key='openai-key-5678')
+    assert main.get_sprout_api_key() == 'sprout-key-1234'
@@ -0,0 +1,150 @@
+import threading
+import time
+
+import pytest
+
+from jobs import FAILED, QUEUED, RUNNING, SUCCEEDED, JobQueue, MemoryJobStore, SQLiteJobStore
+
+
+def wait_for_status(queue, job_id, status, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = queue.get(job_id)
+        if job['status'] == status:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} is {queue.get(job_id)['status']}, expected {status}")
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request, tmp_path):
+    job_store = MemoryJobStore() if request.param == 'memory' else SQLiteJobStore(str(tmp_path / 'jobs.sqlite3'))
+    yield job_store
+    job_store.close()
+
+
+@pytest.fixture
+def queue(store):
+    job_queue = JobQueue(store, workers=1)
+    job_queue.start()
+    yield job_queue
+    job_queue.shutdown(timeout=5)
+
+
+def test_submitted_job_succeeds_with_progress(queue):
+    def handler(params, progress):
+        for done in range(params['steps']):
+            progress(done + 1, params['steps'])
+        return {'sum': params['steps'] * 2}
+
+    queue.register('double', handler)
+    job = queue.submit('double', {'steps': 3})
+    assert job['status'] == QUEUED
+    finished = wait_for_status(queue, job['id'], SUCCEEDED)
+    assert finished['result'] == {'sum': 6}
+    assert finished['progress'] == {'done': 3, 'total': 3}
+    assert finished['error'] is None
+
+
+def test_failing_job_records_the_error(queue):
+    def handler(params, progress):
+        raise RuntimeError("Sprout 502")
+
+    queue.register('broken', handler)
+    job = queue.submit('broken', {})
+    failed = wait_for_status(queue, job['id'], FAILED)
+    assert failed['error'] == "Sprout 502"
+    assert failed['result'] is None
+
+
+def test_unknown_job_type_is_rejected(queue):
+    with pytest.raises(ValueError):
+        queue.submit('missing', {})
+
+
+def test_shutdown_fails_running_and_queued_jobs_after_the_timeout(store):
+    queue = JobQueue(store, workers=1)
+    queue.start()
+    release = threading.Event()
+
+    def slow(params, progress):
+        release.wait(5)
+        progress(1, 1)
+        return 'late'
+
+    queue.register('slow', slow)
+    running = queue.submit('slow', {})
+    queued = queue.submit('slow', {})
+    wait_for_status(queue, running['id'], RUNNING)
+
+    started = time.monotonic()
+    queue.shutdown(timeout=0.2)
+    assert time.monotonic() - started < 2
+
+    assert queue.get(running['id'])['status'] == FAILED
+    assert queue.get(running['id'])['error'] == "Server shut down before the job finished"
+    assert queue.get(queued['id'])['status'] == FAILED
+    assert queue.get(queued['id'])['error'] == "Cancelled by server shutdown"
+
+    # The abandoned worker finishing later must not overwrite the failure
+    release.set()
+    time.sleep(0.2)
+    assert queue.get(running['id'])['status'] == FAILED
+    assert queue.get(running['id'])['result'] is None
+
+
+def test_shutdown_lets_jobs_finish_within_the_timeout(store):
+    queue = JobQueue(store, workers=2)
+    queue.start()
+    queue.register('quick', lambda params, progress: time.sleep(0.05) or 'done')
+    job = queue.submit('quick', {})
+    queue.shutdown(timeout=5)
+    assert queue.get(job['id'])['status'] == SUCCEEDED
+    with pytest.raises(RuntimeError):
+        queue.submit('quick', {})
+
+
+def test_purge_removes_only_old_finished_jobs(store):
+    now = time.time()
+    jobs = {
+        'old-done': {'status': SUCCEEDED, 'updated_at': now - 100},
+        'old-failed': {'status': FAILED, 'updated_at': now - 100},
+        'old-running': {'status': RUNNING, 'updated_at': now - 100},
+        'new-done': {'status': SUCCEEDED, 'updated_at': now},
+    }
+    for job_id, fields in jobs.items():
+        store.save({'id': job_id, 'type': 'test', **fields})
+    assert store.purge(now - 10) == 2
+    assert [job_id for job_id in jobs if store.get(job_id) is not None] == ['old-running', 'new-done']
+
+
+def test_sqlite_store_persists_across_instances(tmp_path):
+    path = str(tmp_path / 'jobs.sqlite3')
+    first = SQLiteJobStore(path)
+    queue = JobQueue(first, workers=1)
+    queue.start()
+    queue.register('answer', lambda params, progress: {'answer': 42})
+    job = queue.submit('answer', {})
+    wait_for_status(queue, job['id'], SUCCEEDED)
+    queue.shutdown()
+    first.close()
+
+    second = SQLiteJobStore(path)
+    try:
+        stored = second.get(job['id'])
+        assert stored['status'] == SUCCEEDED
+        assert stored['result'] == {'answer': 42}
+    finally:
+        second.close()
+
+
+def test_sqlite_store_close_closes_worker_connections(tmp_path):
+    store = SQLiteJobStore(str(tmp_path / 'jobs.sqlite3'))
+    threads = [threading.Thread(target=store.get, args=('missing',)) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(store._connections) == 4
+    store.close()
+    assert store._connections == []
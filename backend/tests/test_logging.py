@@ -0,0 +1,27 @@
+import json
+import logging
+
+import main
+from logging_setup import RedactionFilter, redact, register_secrets
+
+
+def test_keys_from_config_json_are_redacted(tmp_path, monkeypatch):
+    monkeypatch.delenv('SPROUT_API_KEY', raising=False)
+    monkeypatch.delenv('OPENAI_API_KEY', raising=False)
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'config.json').write_text(json.dumps({'sprout_api_key': 'sprout-config-key-123',
+                                                      'openai_api_key': 'openai-config-key-456'}))
+    main.load_config()
+
+    assert redact("GET with key sprout-config-key-123") == "GET with key [REDACTED]"
+    record = logging.makeLogRecord({'msg': "retry %s", 'args': ('openai-config-key-456',),
+                                    'url': '/v1?key=sprout-config-key-123'})
+    RedactionFilter().filter(record)
+    assert record.msg == "retry [REDACTED]"
+    assert record.url == '/v1?key=[REDACTED]'
+
+
+def test_short_values_are_not_redacted():
+    # Masking a short value would garble unrelated text
+    register_secrets('abc', None)
+    assert redact("abc abc") == "abc abc"
@@ -0,0 +1,161 @@
+import random
+from datetime import date
+
+import numpy as np
+import pytest
+
+from analytics import PROFILE_METRICS
+from benchmarks.synthetic import SyntheticDataset
+from metricstore import MetricStore
+from timeseries import GRANULARITIES, MetricSeries, PrefixSums, Rollups
+
+PROFILE_ID = '1000'
+FIRST = date(2024, 1, 1).toordinal()
+
+
+class StoreModel:
+    """What the store should hold after each put, kept as a plain {day: metrics} dict"""
+
+    def __init__(self):
+        self.days = {}
+        self.span = None
+
+    def put(self, start, end, days):
+        """Apply a put and return the (first, last) changed days it should report"""
+        merge = self.span is not None and self.span[0] <= end + 1 and start <= self.span[1] + 1
+        if merge:
+            updated = {day: values for day, values in self.days.items() if not start <= day <= end}
+            updated.update(days)
+            span = (min(self.span[0], start), max(self.span[1], end))
+        else:
+            updated, span = dict(days), (start, end)
+        changed = sorted(day for day in set(self.days) | set(updated) if self.days.get(day) != updated.get(day))
+        self.days, self.span = updated, span
+        if not merge:
+            return (min(days), max(days)) if days else None
+        return (changed[0], changed[-1]) if changed else None
+
+    def series(self, start, end):
+        days = sorted(day for day in self.days if start <= day <= end)
+        return MetricSeries(int(PROFILE_ID), days, {metric: [self.days[day][metric] for day in days]
+                                                    for metric in PROFILE_METRICS})
+
+
+def fetched_days(rng, dataset, start, end):
+    """One Sprout fetch: some days missing, some revised since the last fetch"""
+    days = {}
+    for day in range(start, end + 1):
+        if rng.random() < 0.1:
+            continue
+        values = dataset.day_metrics(int(PROFILE_ID), date.fromordinal(day))
+        if rng.random() < 0.15:
+            values['likes'] += rng.randint(1, 5)
+        days[day] = values
+    return days
+
+
+def as_series(days):
+    ordered = sorted(days)
+    return MetricSeries(PROFILE_ID, ordered, {metric: [days[day][metric] for day in ordered]
+                                              for metric in PROFILE_METRICS})
+
+
+def assert_same_series(actual, expected):
+    np.testing.assert_array_equal(actual.days, expected.days)
+    for metric in PROFILE_METRICS:
+        np.testing.assert_array_equal(actual.columns[metric], expected.columns[metric], err_msg=metric)
+
+
+def random_range(rng, first, last):
+    start = rng.randint(first, last)
+    return start, rng.randint(start, last)
+
+
+@pytest.fixture
+def store(tmp_path):
+    metric_store = MetricStore(str(tmp_path), ttl=10 ** 9)
+    yield metric_store
+    metric_store.close()
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_random_puts_match_a_full_rebuild(store, seed):
+    rng = random.Random(seed)
+    dataset = SyntheticDataset(1, seed=seed)
+    model = StoreModel()
+    for _ in range(40):
+        if model.span is not None and rng.random() < 0.6:
+            # Refresh of the tail, possibly running past it, as a date range up to today does
+            start = rng.randint(model.span[0], model.span[1] + 1)
+            end = rng.randint(max(start, model.span[1] - 10), model.span[1] + 45)
+        else:
+            start, end = random_range(rng, FIRST, FIRST + 500)
+            end = min(end, start + 120)
+        days = fetched_days(rng, dataset, start, end)
+
+        changed = store.put(PROFILE_ID, as_series(days), date.fromordinal(start), date.fromordinal(end))
+
+        assert changed == model.put(start, end, days)
+        mapping = store._mapping(PROFILE_ID)
+        assert (mapping.first_day, mapping.last_day) == model.span
+        stored = mapping.series(PROFILE_ID)
+        assert_same_series(stored, model.series(*model.span))
+        rebuilt_rollups = Rollups.from_series(stored)
+        for granularity in GRANULARITIES:
+            for actual, expected in zip(mapping.rollups.periods[granularity][:2],
+                                        rebuilt_rollups.periods[granularity][:2]):
+                np.testing.assert_array_equal(actual, expected, err_msg=granularity)
+            for metric in PROFILE_METRICS:
+                np.testing.assert_array_equal(mapping.rollups.periods[granularity][2][metric],
+                                              rebuilt_rollups.periods[granularity][2][metric])
+        rebuilt_prefix = PrefixSums.from_series(stored, *model.span)
+        np.testing.assert_array_equal(mapping.prefix.present, rebuilt_prefix.present)
+        np.testing.assert_array_equal(mapping.prefix.fingerprints, rebuilt_prefix.fingerprints)
+        for metric in PROFILE_METRICS:
+            np.testing.assert_array_equal(mapping.prefix.sums[metric], rebuilt_prefix.sums[metric])
+
+
+def test_range_totals_match_naive_sum(store):
+    rng = random.Random(7)
+    dataset = SyntheticDataset(1, seed=7)
+    model = StoreModel()
+    # Jan 2024 .. Mar 2025, stored in overlapping and adjoining pieces
+    for start, end in ((FIRST, FIRST + 200), (FIRST + 150, FIRST + 330), (FIRST + 331, FIRST + 430)):
+        days = fetched_days(rng, dataset, start, end)
+        store.put(PROFILE_ID, as_series(days), date.fromordinal(start), date.fromordinal(end))
+        model.put(start, end, days)
+    first, last = model.span
+    boundaries = [date(2024, 3, 31), date(2024, 6, 30), date(2024, 11, 30), date(2024, 12, 31)]
+    ranges = [(day.toordinal() - before, day.toordinal() + 1 + after)
+              for day in boundaries for before in (0, 3, 45) for after in (0, 3, 45)]
+    ranges += [random_range(rng, first, last) for _ in range(200)]
+    # Whole calendar periods are answered from the rollups
+    ranges += [(date(2024, 4, 1).toordinal(), date(2024, 6, 30).toordinal()),
+               (date(2024, 2, 1).toordinal(), date(2024, 2, 29).toordinal()),
+               (date(2024, 1, 1).toordinal(), date(2024, 12, 31).toordinal())]
+    for start, end in ranges:
+        expected = model.series(start, end)
+        result = store.range_totals(PROFILE_ID, date.fromordinal(start), date.fromordinal(end))
+        assert result == (len(expected), expected.totals()), (start, end)
+
+
+def test_version_only_changes_when_a_day_in_the_range_does(store):
+    rng = random.Random(11)
+    dataset = SyntheticDataset(1, seed=11)
+    model = StoreModel()
+    days = fetched_days(rng, dataset, FIRST, FIRST + 365)
+    store.put(PROFILE_ID, as_series(days), date.fromordinal(FIRST), date.fromordinal(FIRST + 365))
+    model.put(FIRST, FIRST + 365, days)
+    for _ in range(15):
+        before = dict(model.days)
+        ranges = [random_range(rng, FIRST, FIRST + 365) for _ in range(40)]
+        versions = [store.get(PROFILE_ID, date.fromordinal(start), date.fromordinal(end)).version
+                    for start, end in ranges]
+        start, end = random_range(rng, FIRST, FIRST + 365)
+        days = fetched_days(rng, dataset, start, min(end, start + 30))
+        store.put(PROFILE_ID, as_series(days), date.fromordinal(start), date.fromordinal(min(end, start + 30)))
+        model.put(start, min(end, start + 30), days)
+        for (first, last), version in zip(ranges, versions):
+            unchanged = all(before.get(day) == model.days.get(day) for day in range(first, last + 1))
+            entry = store.get(PROFILE_ID, date.fromordinal(first), date.fromordinal(last))
+            assert (entry.version == version) == unchanged, (first, last)
@@ -0,0 +1,134 @@
+import random
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import SyntheticDataset
+from timeseries import GRANULARITIES, MetricSeries, PrefixSums, Rollups, calendar_period, period_end, period_starts
+
+FIRST = date(2023, 11, 15).toordinal()
+LAST = date(2025, 2, 10).toordinal()
+
+
+def make_series(seed, first=FIRST, last=LAST, gap_rate=0.1):
+    """Synthetic daily series over first..last with a random share of days missing"""
+    rng = random.Random(seed)
+    rows = SyntheticDataset(1, seed=seed).daily_rows(1000, date.fromordinal(first), date.fromordinal(last))
+    return MetricSeries.from_rows([row for row in rows if rng.random() >= gap_rate])
+
+
+def naive_totals(series, start, end):
+    inside = (series.days >= start) & (series.days <= end)
+    return int(inside.sum()), {metric: column[inside].sum().item() for metric, column in series.columns.items()}
+
+
+def assert_same_rollups(actual, expected):
+    for granularity in GRANULARITIES:
+        actual_starts, actual_counts, actual_columns = actual.periods[granularity]
+        expected_starts, expected_counts, expected_columns = expected.periods[granularity]
+        np.testing.assert_array_equal(actual_starts, expected_starts, err_msg=granularity)
+        np.testing.assert_array_equal(actual_counts, expected_counts, err_msg=granularity)
+        for metric, column in expected_columns.items():
+            np.testing.assert_array_equal(actual_columns[metric], column, err_msg=f'{granularity} {metric}')
+
+
+def assert_same_prefix(actual, expected):
+    assert actual.first_day == expected.first_day
+    np.testing.assert_array_equal(actual.present, expected.present)
+    np.testing.assert_array_equal(actual.fingerprints, expected.fingerprints)
+    for metric, column in expected.sums.items():
+        np.testing.assert_array_equal(actual.sums[metric], column, err_msg=metric)
+
+
+@pytest.mark.parametrize('granularity', GRANULARITIES)
+def test_periods_are_calendar_aligned(granularity):
+    for day in (date(2023, 12, 31), date(2024, 1, 1), date(2024, 2, 29), date(2024, 3, 31), date(2024, 4, 1)):
+        start = int(period_starts(granularity, [day.toordinal()])[0])
+        end = period_end(granularity, start)
+        assert start <= day.toordinal() <= end
+        assert calendar_period(date.fromordinal(start), date.fromordinal(end)) == (granularity, start)
+        assert int(period_starts(granularity, [end + 1])[0]) == end + 1
+
+
+def test_range_totals_across_period_boundaries():
+    series = make_series(1)
+    prefix = PrefixSums.from_series(series, FIRST, LAST)
+    boundaries = [date(2023, 12, 31), date(2024, 1, 31), date(2024, 2, 29), date(2024, 3, 31),
+                  date(2024, 6, 30), date(2024, 9, 30), date(2024, 12, 31)]
+    for boundary in boundaries:
+        end_of_period = boundary.toordinal()
+        for before in (0, 1, 6, 40):
+            for after in (0, 1, 6, 40):
+                start, end = end_of_period - before, end_of_period + 1 + after
+                assert prefix.range_totals(start, end) == naive_totals(series, start, end), (boundary, before, after)
+
+
+def test_range_totals_match_naive_sum_for_random_ranges():
+    series = make_series(2, gap_rate=0.3)
+    prefix = PrefixSums.from_series(series, FIRST, LAST)
+    rng = random.Random(2)
+    for _ in range(500):
+        start = rng.randint(FIRST - 30, LAST + 30)
+        end = rng.randint(start, LAST + 40)
+        assert prefix.range_totals(start, end) == naive_totals(series, start, end), (start, end)
+
+
+def test_rollup_lookup_matches_naive_sum():
+    series = make_series(3)
+    rollups = Rollups.from_series(series)
+    for granularity in GRANULARITIES:
+        start = int(period_starts(granularity, [FIRST])[0])
+        while start <= LAST:
+            end = period_end(granularity, start)
+            days, totals = naive_totals(series, start, end)
+            assert rollups.lookup(granularity, start) == ((days, totals) if days else None), (granularity, start)
+            start = end + 1
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_extended_and_updated_match_rebuild(seed):
+    rng = random.Random(seed)
+    series = make_series(seed)
+    for _ in range(10):
+        # Replace everything from a random day on, as a refresh of the tail does
+        cut = rng.randint(FIRST + 1, LAST - 1)
+        new_end = rng.randint(cut, LAST + 120)
+        head = series.between(date.fromordinal(FIRST), date.fromordinal(cut - 1))
+        tail = make_series(rng.randint(100, 10 ** 6), cut, new_end, gap_rate=rng.random() * 0.5)
+        updated = MetricSeries.concat([head, tail])
+
+        prefix = PrefixSums.from_series(series, FIRST, LAST).extended(tail, cut, new_end)
+        assert_same_prefix(prefix, PrefixSums.from_series(updated, FIRST, new_end))
+        rollups = Rollups.from_series(series).updated(prefix, cut, max(LAST, new_end))
+        assert_same_rollups(rollups, Rollups.from_series(updated))
+
+
+def test_fingerprint_only_changes_for_ranges_holding_a_changed_day():
+    series = make_series(4)
+    prefix = PrefixSums.from_series(series, FIRST, LAST)
+    index = np.searchsorted(series.days, date(2024, 5, 15).toordinal())
+    changed_day = int(series.days[index])
+    columns = {metric: column.copy() for metric, column in series.columns.items()}
+    columns['likes'][index] += 1
+    revised = PrefixSums.from_series(MetricSeries(series.profile_id, series.days, columns), FIRST, LAST)
+
+    rng = random.Random(4)
+    for _ in range(300):
+        start = rng.randint(FIRST, LAST)
+        end = rng.randint(start, LAST)
+        same = prefix.fingerprint(start, end) == revised.fingerprint(start, end)
+        assert same == (not start <= changed_day <= end), (start, end)
+
+
+def test_from_rows_attributes_rows_and_skips_rows_without_a_day():
+    day = date(2024, 1, 1)
+    rows = [
+        {'dimensions': {'reporting_period.by(day)': (day + timedelta(days=1)).isoformat()}, 'metrics': {'likes': 2}},
+        {'dimensions': {'reporting_period.by(day)': day.isoformat()}, 'metrics': {'likes': 1}},
+        {'dimensions': {}, 'metrics': {'likes': 50}},
+    ]
+    series = MetricSeries.from_rows(rows, profile_id='1000')
+    assert series.profile_id == 1000
+    assert series.dates == ['2024-01-01', '2024-01-02']
+    assert series.totals(['likes']) == {'likes': 3}
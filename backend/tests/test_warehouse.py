@@ -0,0 +1,126 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+pytest.importorskip('pyarrow')
+
+import main
+from analytics import PROFILE_METRICS
+from benchmarks.synthetic import SyntheticDataset
+from serialization import loads
+from timeseries import MetricSeries
+from warehouse import COVERAGE_FILE, Warehouse
+
+
+@pytest.fixture
+def warehouse(tmp_path):
+    return Warehouse(str(tmp_path / 'warehouse'), settle_days=3)
+
+
+def test_ids_the_warehouse_cannot_store_skip_it(warehouse, monkeypatch):
+    fetched = []
+
+    def fetch(profile_id, start_date, end_date):
+        fetched.append(profile_id)
+        return MetricSeries(profile_id, [], {})
+
+    def resolve_customer_id():
+        raise AssertionError("the customer ID is not needed when the warehouse is skipped")
+
+    monkeypatch.setattr(main, 'warehouse', warehouse)
+    monkeypatch.setattr(main, 'fetch_profile_stats', fetch)
+    monkeypatch.setattr(main, 'resolve_customer_id', resolve_customer_id)
+    series = main.load_profile_stats('a/b', '2024-01-01', '2024-01-31')
+    assert series.profile_id == 'a/b'
+    assert fetched == ['a/b']
+    assert not Warehouse.accepts('a/b') and not Warehouse.accepts('1000', '..')
+    assert Warehouse.accepts('1000', 'cust_1-a')
+
+
+def make_series(start, end, skip_every=7, bump=0):
+    """Synthetic daily series between two ISO dates, every skip_every-th day missing"""
+    rows = [row for index, row in enumerate(SyntheticDataset(1).daily_rows(1000, start, end))
+            if index % skip_every != skip_every - 1]
+    for row in rows:
+        row['metrics']['likes'] += bump
+    return MetricSeries.from_rows(rows)
+
+
+def assert_same_series(actual, expected):
+    np.testing.assert_array_equal(actual.days, expected.days)
+    assert actual.metrics == expected.metrics
+    for metric, column in expected.columns.items():
+        np.testing.assert_array_equal(actual.columns[metric], column, err_msg=metric)
+
+
+def test_write_then_read_round_trips_across_month_partitions(warehouse, tmp_path):
+    series = make_series('2024-01-15', '2024-03-10')
+    assert warehouse.write('cust', series, '2024-01-15', '2024-03-10') == len(series)
+
+    profile_dir = tmp_path / 'warehouse' / 'customer_id=cust' / 'profile_id=1000'
+    months = sorted(path.name for path in profile_dir.iterdir() if path.is_dir())
+    assert months == ['month=2024-01', 'month=2024-02', 'month=2024-03']
+    assert all((profile_dir / month / 'data.parquet').exists() for month in months)
+    coverage = loads((profile_dir / COVERAGE_FILE).read_bytes())
+    assert coverage == {'metrics': PROFILE_METRICS,
+                        'ranges': [[date(2024, 1, 15).toordinal(), date(2024, 3, 10).toordinal()]]}
+
+    assert_same_series(warehouse.read('cust', 1000, '2024-01-15', '2024-03-10'), series)
+    assert_same_series(warehouse.read('cust', 1000, '2024-01-31', '2024-02-01'),
+                       series.between('2024-01-31', '2024-02-01'))
+    assert_same_series(warehouse.read('cust', 1000, '2024-02-01', '2024-02-29'),
+                       series.between('2024-02-01', '2024-02-29'))
+    assert len(warehouse.read('cust', 1000, '2023-06-01', '2023-06-30')) == 0
+
+
+def test_covers_only_stored_ranges_and_metrics(warehouse):
+    warehouse.write('cust', make_series('2024-01-15', '2024-03-10'), '2024-01-15', '2024-03-10')
+    assert warehouse.covers('cust', 1000, '2024-01-15', '2024-03-10')
+    assert warehouse.covers('cust', 1000, '2024-02-01', '2024-02-29')
+    assert not warehouse.covers('cust', 1000, '2024-01-14', '2024-02-01')
+    assert not warehouse.covers('cust', 1000, '2024-03-01', '2024-03-11')
+    assert not warehouse.covers('cust', 1001, '2024-02-01', '2024-02-29')
+    assert not warehouse.covers('cust', 1000, '2024-02-01', '2024-02-29', metrics=PROFILE_METRICS + ['saves'])
+
+
+def test_adjoining_and_overlapping_writes_merge(warehouse):
+    first = make_series('2024-01-01', '2024-02-15')
+    warehouse.write('cust', first, '2024-01-01', '2024-02-15')
+    second = make_series('2024-02-16', '2024-03-31')
+    warehouse.write('cust', second, '2024-02-16', '2024-03-31')
+    assert warehouse.covers('cust', 1000, '2024-01-01', '2024-03-31')
+
+    # A refetch of the middle replaces those days and keeps the rest of each partition
+    revised = make_series('2024-02-10', '2024-02-20', skip_every=3, bump=1000)
+    warehouse.write('cust', revised, '2024-02-10', '2024-02-20')
+    outside = MetricSeries.concat([first, second])
+    keep = (outside.days < revised.days[0]) | (outside.days > date(2024, 2, 20).toordinal())
+    expected = MetricSeries.concat([
+        MetricSeries(1000, outside.days[keep], {metric: column[keep] for metric, column in outside.columns.items()}),
+        revised
+    ])
+    assert_same_series(warehouse.read('cust', 1000, '2024-01-01', '2024-03-31'), expected)
+
+
+def test_unsettled_days_are_not_stored(tmp_path):
+    warehouse = Warehouse(str(tmp_path / 'warehouse'), settle_days=3)
+    today = date.today()
+    start = today - timedelta(days=20)
+    series = make_series(start.isoformat(), today.isoformat(), skip_every=1000)
+    stored = warehouse.write('cust', series, start.isoformat(), today.isoformat())
+    assert stored == 21 - 3
+    settled = date.fromordinal(warehouse.settled_until()).isoformat()
+    assert warehouse.covers('cust', 1000, start.isoformat(), settled)
+    assert not warehouse.covers('cust', 1000, start.isoformat(), today.isoformat())
+    assert_same_series(warehouse.read('cust', 1000, start.isoformat(), today.isoformat()),
+                       series.between(start.isoformat(), settled))
+
+
+def test_new_metric_columns_reset_coverage(warehouse):
+    warehouse.write('cust', make_series('2024-01-01', '2024-01-31'), '2024-01-01', '2024-01-31')
+    narrower = make_series('2024-03-01', '2024-03-31')
+    narrower = MetricSeries(1000, narrower.days, {'likes': narrower.columns['likes']})
+    warehouse.write('cust', narrower, '2024-03-01', '2024-03-31')
+    assert warehouse.covers('cust', 1000, '2024-03-01', '2024-03-31', metrics=['likes'])
+    assert not warehouse.covers('cust', 1000, '2024-01-01', '2024-01-31', metrics=['likes'])
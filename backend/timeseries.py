@@ -0,0 +1,355 @@
+"""
+Compact columnar container for one profile's daily Sprout metrics. Days are
+stored as int32 proleptic ordinals (date.toordinal()) and each metric as one
+int64 (or float64) numpy column, about 8 bytes per value instead of the few
+hundred a nested row dict costs.
+
+Rollups holds per-profile totals for calendar weeks (Monday to Sunday),
+months, quarters and years, so the totals of a whole period are one lookup.
+PrefixSums answers the totals of any date range with two reads per metric.
+"""
+from datetime import date
+
+import numpy as np
+
+from analytics import DAY_DIMENSION, PROFILE_METRICS
+
+GRANULARITIES = ('week', 'month', 'quarter', 'year')
+# datetime64[D] counts days from 1970-01-01; ordinals count from 0001-01-01
+_UNIX_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def to_ordinal(day):
+    """Day ordinal for a date or ISO date string"""
+    return (day if isinstance(day, date) else date.fromisoformat(day)).toordinal()
+
+
+def period_starts(granularity, days):
+    """Ordinal of the first day of the granularity period holding each day ordinal"""
+    days = np.asarray(days, dtype=np.int64)
+    if granularity == 'week':
+        # Ordinal 1 (0001-01-01) is a Monday
+        return days - (days - 1) % 7
+    months = (days - _UNIX_EPOCH_ORDINAL).astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+    if granularity == 'quarter':
+        months -= months % 3
+    elif granularity == 'year':
+        months -= months % 12
+    elif granularity != 'month':
+        raise ValueError(f"Unknown granularity: {granularity}")
+    return months.astype('datetime64[M]').astype('datetime64[D]').astype(np.int64) + _UNIX_EPOCH_ORDINAL
+
+
+def period_end(granularity, start):
+    """Last day ordinal of the period starting at start"""
+    if granularity == 'week':
+        return start + 6
+    day = date.fromordinal(start)
+    months = {'month': 1, 'quarter': 3, 'year': 12}[granularity]
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1).toordinal() - 1
+
+
+def calendar_period(start_date, end_date):
+    """(granularity, start ordinal) when the range is exactly one calendar period, else None"""
+    start, end = to_ordinal(start_date), to_ordinal(end_date)
+    for granularity in GRANULARITIES:
+        if int(period_starts(granularity, [start])[0]) == start and period_end(granularity, start) == end:
+            return granularity, start
+    return None
+
+
+def day_fingerprints(series):
+    """64-bit hash of each row's day and metric values, equal only for identical rows"""
+    hashes = series.days.astype(np.uint64) * np.uint64(0x9E3779B97F4A7C15)
+    for column in series.columns.values():
+        values = np.ascontiguousarray(column).view(np.uint64)
+        hashes = (hashes ^ (values + np.uint64(0x9E3779B97F4A7C15) + (hashes << np.uint64(6)))) \
+            * np.uint64(0xBF58476D1CE4E5B9)
+        hashes ^= hashes >> np.uint64(31)
+    return hashes
+
+
+def normalize_profile_id(profile_id):
+    """
+    Profile ID as Sprout returns it: an int when numeric. Request paths carry
+    the ID as a string, so every series built from either source agrees.
+    """
+    if isinstance(profile_id, str) and profile_id.isascii() and profile_id.isdigit():
+        return int(profile_id)
+    return profile_id
+
+
+def _column(values):
+    column = np.asarray(values)
+    if column.dtype.kind not in 'iuf':
+        column = np.asarray(values, dtype=np.float64)
+    return column.astype(np.int64 if column.dtype.kind in 'iu' else np.float64, copy=False)
+
+
+class MetricSeries:
+    """Daily metric columns for one profile, sorted by day"""
+
+    __slots__ = ('profile_id', 'days', 'columns', 'known_totals')
+
+    def __init__(self, profile_id, days, columns, known_totals=None):
+        self.profile_id = normalize_profile_id(profile_id)
+        self.days = np.asarray(days, dtype=np.int32)
+        self.columns = {metric: _column(values) for metric, values in columns.items()}
+        # Totals already known from a rollup, so totals() need not sum the columns
+        self.known_totals = known_totals
+
+    @classmethod
+    def empty(cls, profile_id=None, metrics=PROFILE_METRICS):
+        return cls(profile_id, np.empty(0, dtype=np.int32), {metric: np.empty(0, dtype=np.int64) for metric in metrics})
+
+    @classmethod
+    def from_rows(cls, rows, metrics=PROFILE_METRICS, profile_id=None):
+        """
+        Build from Sprout analytics rows. Rows without a day dimension are
+        skipped (analytics.iter_daily_rows skips them too); rows without a
+        customer_profile_id belong to profile_id when it is given.
+        """
+        days = []
+        values = {metric: [] for metric in metrics}
+        for row in rows:
+            dimensions = row.get('dimensions') or {}
+            day = dimensions.get(DAY_DIMENSION)
+            if day is None:
+                continue
+            if profile_id is None:
+                profile_id = dimensions.get('customer_profile_id')
+            days.append(to_ordinal(day))
+            row_metrics = row.get('metrics', row)
+            for metric in metrics:
+                values[metric].append(row_metrics.get(metric) or 0)
+        return cls(profile_id, days, values)._sorted()
+
+    @classmethod
+    def from_pages(cls, pages, metrics=PROFILE_METRICS, profile_id=None):
+        """Build from an iterable of Sprout analytics pages, converting each page as it arrives"""
+        parts = [cls.from_rows(page.get('data') or [], metrics, profile_id) for page in pages]
+        if not parts:
+            return cls.empty(profile_id, metrics)
+        return cls.concat(parts)
+
+    @classmethod
+    def concat(cls, parts):
+        parts = list(parts)
+        profile_id = next((part.profile_id for part in parts if part.profile_id is not None), None)
+        metrics = list(parts[0].columns)
+        return cls(
+            profile_id,
+            np.concatenate([part.days for part in parts]),
+            {metric: np.concatenate([part.columns[metric] for part in parts]) for metric in metrics}
+        )._sorted()
+
+    @classmethod
+    def from_dict(cls, data):
+        """Inverse of to_dict; accepts the lists a JSON round trip produces"""
+        return cls(data['profile_id'], data['days'], data['metrics'], data.get('totals'))
+
+    def to_dict(self):
+        """Cacheable form; orjson serializes the numpy columns directly"""
+        data = {'profile_id': self.profile_id, 'days': self.days, 'metrics': self.columns}
+        if self.known_totals is not None:
+            data['totals'] = self.known_totals
+        return data
+
+    def _sorted(self):
+        if len(self.days) > 1 and np.any(self.days[1:] < self.days[:-1]):
+            order = np.argsort(self.days, kind='stable')
+            self.days = self.days[order]
+            self.columns = {metric: column[order] for metric, column in self.columns.items()}
+        return self
+
+    def __len__(self):
+        return len(self.days)
+
+    @property
+    def metrics(self):
+        return list(self.columns)
+
+    @property
+    def nbytes(self):
+        return self.days.nbytes + sum(column.nbytes for column in self.columns.values())
+
+    @property
+    def dates(self):
+        """ISO dates of the rows"""
+        return [date.fromordinal(day).isoformat() for day in self.days.tolist()]
+
+    def totals(self, metrics=None):
+        """{metric: total} as plain Python numbers"""
+        metrics = metrics or list(self.columns)
+        if self.known_totals is not None and all(metric in self.known_totals for metric in metrics):
+            return {metric: self.known_totals[metric] for metric in metrics}
+        return {metric: self.columns[metric].sum().item() if metric in self.columns else 0
+                for metric in metrics}
+
+    def between(self, start_date, end_date):
+        """Rows from start_date to end_date inclusive, as views on the same columns"""
+        start = np.searchsorted(self.days, to_ordinal(start_date), side='left')
+        end = np.searchsorted(self.days, to_ordinal(end_date), side='right')
+        return MetricSeries(self.profile_id, self.days[start:end],
+                            {metric: column[start:end] for metric, column in self.columns.items()})
+
+    def to_payload(self):
+        """Sprout-shaped analytics payload with one row per day"""
+        metrics = self.metrics
+        columns = [self.columns[metric].tolist() for metric in metrics]
+        rows = []
+        for index, day in enumerate(self.dates):
+            rows.append({
+                'dimensions': {'customer_profile_id': self.profile_id, DAY_DIMENSION: day},
+                'metrics': {metric: column[index] for metric, column in zip(metrics, columns)}
+            })
+        return {'data': rows, 'paging': {'current_page': 1, 'total_pages': 1}}
+
+
+class Rollups:
+    """
+    Totals of a profile's daily metrics per calendar week, month, quarter and
+    year: for each granularity, sorted period start ordinals, the number of
+    days present in each period and one total column per metric.
+    """
+
+    __slots__ = ('periods',)
+
+    def __init__(self, periods):
+        self.periods = periods
+
+    @classmethod
+    def from_series(cls, series):
+        periods = {}
+        for granularity in GRANULARITIES:
+            keys = period_starts(granularity, series.days)
+            index = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else np.empty(0, dtype=np.intp)
+            periods[granularity] = (
+                keys[index].astype(np.int32),
+                np.diff(np.r_[index, len(keys)]).astype(np.int32),
+                {metric: np.add.reduceat(column, index) if len(index) else column[:0]
+                 for metric, column in series.columns.items()}
+            )
+        return cls(periods)
+
+    def updated(self, prefix, start, end):
+        """
+        Rollups after the days between the start and end ordinals changed:
+        periods touching that range are recomputed from the PrefixSums of the
+        new data, a constant amount of work per period, and every other period
+        is carried over as is. Periods left without days are dropped.
+        """
+        periods = {}
+        for granularity in GRANULARITIES:
+            first = int(period_starts(granularity, [start])[0])
+            last = int(period_starts(granularity, [end])[0])
+            fresh_starts = [first]
+            while fresh_starts[-1] < last:
+                fresh_starts.append(period_end(granularity, fresh_starts[-1]) + 1)
+            fresh_starts = np.array(fresh_starts, dtype=np.int32)
+            fresh_ends = np.array([period_end(granularity, day) for day in fresh_starts.tolist()], dtype=np.int64)
+            fresh_counts, fresh_totals = prefix.ranges_totals(fresh_starts, fresh_ends)
+            present = fresh_counts > 0
+            starts, counts, columns = self.periods[granularity]
+            keep = (starts < first) | (starts > last)
+            merged_starts = np.concatenate([starts[keep], fresh_starts[present]])
+            order = np.argsort(merged_starts, kind='stable')
+            periods[granularity] = (
+                merged_starts[order],
+                np.concatenate([counts[keep], fresh_counts[present].astype(np.int32)])[order],
+                {metric: np.concatenate([column[keep], fresh_totals[metric][present]])[order]
+                 for metric, column in columns.items()}
+            )
+        return Rollups(periods)
+
+    def lookup(self, granularity, start):
+        """(days, {metric: total}) for the period starting at the start ordinal, or None"""
+        starts, counts, columns = self.periods[granularity]
+        index = np.searchsorted(starts, start)
+        if index == len(starts) or starts[index] != start:
+            return None
+        return int(counts[index]), {metric: column[index].item() for metric, column in columns.items()}
+
+
+class PrefixSums:
+    """
+    Cumulative metric sums over every day from first_day to last_day, whether
+    or not the day has data: sums[metric][k] is the total of the days before
+    first_day + k and present[k] how many of them have a row. The totals of
+    any range are then sums[metric][end + 1] - sums[metric][start], no search
+    or summing needed.
+
+    fingerprints accumulates day_fingerprints the same way (wrapping at 2**64),
+    so the fingerprint of any range identifies its content in constant time.
+    """
+
+    __slots__ = ('first_day', 'present', 'sums', 'fingerprints')
+
+    def __init__(self, first_day, present, sums, fingerprints):
+        self.first_day = first_day
+        self.present = present
+        self.sums = sums
+        self.fingerprints = fingerprints
+
+    @classmethod
+    def from_series(cls, series, first_day, last_day):
+        """Index series over first_day..last_day; rows outside the span are ignored"""
+        inside = (series.days >= first_day) & (series.days <= last_day)
+        slots = series.days[inside].astype(np.int64) - first_day + 1
+        present = np.zeros(last_day - first_day + 2, dtype=np.int32)
+        present[slots] = 1
+        sums = {}
+        for metric, column in series.columns.items():
+            dense = np.zeros(len(present), dtype=column.dtype)
+            dense[slots] = column[inside]
+            sums[metric] = np.cumsum(dense)
+        fingerprints = np.zeros(len(present), dtype=np.uint64)
+        fingerprints[slots] = day_fingerprints(series)[inside]
+        return cls(first_day, np.cumsum(present, dtype=np.int32), sums, np.cumsum(fingerprints, dtype=np.uint64))
+
+    @property
+    def last_day(self):
+        return self.first_day + len(self.present) - 2
+
+    def extended(self, series, start, end):
+        """
+        Index after replacing every day from the start ordinal on with series,
+        which covers start..end. Work is proportional to the new days; the
+        entries before start are reused as they are.
+        """
+        if not self.first_day <= start <= self.last_day + 1:
+            raise ValueError("extended() needs start inside the indexed span or just after it")
+        keep = start - self.first_day + 1
+        tail = PrefixSums.from_series(series, start, end)
+        return PrefixSums(
+            self.first_day,
+            np.concatenate([self.present[:keep], self.present[keep - 1] + tail.present[1:]]),
+            {metric: np.concatenate([column[:keep], column[keep - 1] + tail.sums[metric][1:]])
+             for metric, column in self.sums.items()},
+            np.concatenate([self.fingerprints[:keep], self.fingerprints[keep - 1] + tail.fingerprints[1:]])
+        )
+
+    def _bounds(self, start, end):
+        size = len(self.present) - 1
+        low = np.clip(np.asarray(start, dtype=np.int64) - self.first_day, 0, size)
+        high = np.maximum(np.clip(np.asarray(end, dtype=np.int64) - self.first_day + 1, 0, size), low)
+        return low, high
+
+    def ranges_totals(self, starts, ends, metrics=None):
+        """Vectorized range_totals: (days array, {metric: totals array}) for each start/end ordinal pair"""
+        low, high = self._bounds(starts, ends)
+        return (self.present[high] - self.present[low],
+                {metric: self.sums[metric][high] - self.sums[metric][low] for metric in (metrics or self.sums)})
+
+    def range_totals(self, start, end, metrics=None):
+        """(days with data, {metric: total}) between the start and end ordinals, clipped to the span"""
+        low, high = self._bounds(start, end)
+        totals = {metric: (self.sums[metric][high] - self.sums[metric][low]).item() if metric in self.sums else 0
+                  for metric in (metrics or self.sums)}
+        return int(self.present[high] - self.present[low]), totals
+
+    def fingerprint(self, start, end):
+        """Content fingerprint of the days between the start and end ordinals"""
+        low, high = self._bounds(start, end)
+        return (int(self.fingerprints[high]) - int(self.fingerprints[low])) % (1 << 64)
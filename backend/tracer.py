@@ -0,0 +1,208 @@
+"""
+Lightweight tracing with OpenTelemetry-compatible span data. Spans are
+nested through a context variable, accept and emit W3C traceparent headers,
+and are exported as OTLP-style JSON lines to TRACE_EXPORT_PATH on a
+background thread. Tracing is off (spans are no-ops) unless that is set.
+"""
+import atexit
+import contextvars
+import functools
+import os
+import queue
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from serialization import dumps
+
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+
+STATUS_UNSET = 0
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+_TRACEPARENT = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+
+_current_span = contextvars.ContextVar('current_span', default=None)
+
+
+class Span:
+    __slots__ = ('trace_id', 'span_id', 'parent_id', 'name', 'kind', 'start_ns', 'end_ns',
+                 'attributes', 'status', 'status_message')
+
+    def __init__(self, name, trace_id, parent_id=None, kind=SPAN_KIND_INTERNAL, attributes=None):
+        self.trace_id = trace_id
+        self.span_id = f'{random.getrandbits(64):016x}'
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = dict(attributes or {})
+        self.status = STATUS_UNSET
+        self.status_message = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def set_error(self, exc):
+        self.status = STATUS_ERROR
+        self.status_message = f'{type(exc).__name__}: {exc}'
+
+    @property
+    def traceparent(self):
+        return f'00-{self.trace_id}-{self.span_id}-01'
+
+    def to_dict(self):
+        """Span in the OTLP JSON field layout"""
+        span = {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': self.kind,
+            'startTimeUnixNano': self.start_ns,
+            'endTimeUnixNano': self.end_ns,
+            'attributes': [{'key': key, 'value': _attribute_value(value)} for key, value in self.attributes.items()],
+            'status': {'code': self.status}
+        }
+        if self.parent_id:
+            span['parentSpanId'] = self.parent_id
+        if self.status_message:
+            span['status']['message'] = self.status_message
+        return span
+
+
+def _attribute_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+class FileExporter:
+    """Appends finished spans as JSON lines from a background thread"""
+
+    def __init__(self, path, service_name):
+        self.path = path
+        self.service_name = service_name
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name='trace-exporter', daemon=True)
+        self._thread.start()
+
+    def export(self, span):
+        self._queue.put(span)
+
+    def _run(self):
+        with open(self.path, 'ab') as f:
+            while True:
+                span = self._queue.get()
+                if span is None:
+                    return
+                f.write(dumps({'resource': {'service.name': self.service_name}, 'span': span.to_dict()}) + b'\n')
+                if self._queue.empty():
+                    f.flush()
+
+    def shutdown(self):
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+
+class Tracer:
+    def __init__(self, exporter=None, sample_rate=1.0):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+
+    @property
+    def enabled(self):
+        return self.exporter is not None
+
+    @contextmanager
+    def start_span(self, name, kind=SPAN_KIND_INTERNAL, traceparent=None, **attributes):
+        """
+        Run the block inside a new span, a child of the current span (or of
+        traceparent when starting a trace from an incoming request). Yields
+        None when tracing is off or the trace was not sampled.
+        """
+        parent = _current_span.get()
+        if parent is None:
+            if not self.enabled:
+                yield None
+                return
+            trace_id, parent_id, sampled = _parse_traceparent(traceparent)
+            if trace_id is None:
+                trace_id, sampled = f'{random.getrandbits(128):032x}', random.random() < self.sample_rate
+            if not sampled:
+                yield None
+                return
+        else:
+            trace_id, parent_id = parent.trace_id, parent.span_id
+
+        span = Span(name, trace_id, parent_id, kind, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.set_error(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end_ns = time.time_ns()
+            self.exporter.export(span)
+
+    def shutdown(self):
+        if self.exporter is not None:
+            self.exporter.shutdown()
+
+
+def _parse_traceparent(header):
+    match = _TRACEPARENT.match(header or '')
+    if match is None:
+        return None, None, False
+    return match.group(1), match.group(2), int(match.group(3), 16) & 1 == 1
+
+
+def current_span():
+    return _current_span.get()
+
+
+def start_span(name, **kwargs):
+    return TRACER.start_span(name, **kwargs)
+
+
+def traced(name):
+    """Decorator running the function inside a span called name"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current_span.get() is None:
+                return func(*args, **kwargs)
+            with TRACER.start_span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def inject_traceparent(headers):
+    """Add the current span's traceparent to outgoing request headers"""
+    span = _current_span.get()
+    if span is not None:
+        headers['traceparent'] = span.traceparent
+    return headers
+
+
+def _create_tracer():
+    path = os.environ.get('TRACE_EXPORT_PATH')
+    exporter = FileExporter(path, os.environ.get('TRACE_SERVICE_NAME', 'social-media-analytics')) if path else None
+    tracer = Tracer(exporter, sample_rate=float(os.environ.get('TRACE_SAMPLE_RATE', 1.0)))
+    atexit.register(tracer.shutdown)
+    return tracer
+
+
+TRACER = _create_tracer()
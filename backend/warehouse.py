@@ -0,0 +1,210 @@
+"""
+Local columnar warehouse for daily Sprout metrics. Fetched series are kept as
+Parquet files partitioned Hive-style by customer, profile and month:
+
+    <WAREHOUSE_PATH>/customer_id=<id>/profile_id=<id>/month=YYYY-MM/data.parquet
+
+A read only opens the month partitions its date range touches and pushes the
+day filter down to Parquet row-group statistics. Each profile directory also
+holds _coverage.json, the day ranges that were fetched and have settled, so a
+historical range can be answered without calling Sprout at all. Days newer
+than WAREHOUSE_SETTLE_DAYS are never stored; Sprout still revises them.
+
+pyarrow is optional and only imported when WAREHOUSE_PATH is set.
+"""
+import os
+import re
+import tempfile
+import threading
+from datetime import date, timedelta
+
+import numpy as np
+
+from analytics import PROFILE_METRICS
+from serialization import dumps, loads
+from timeseries import MetricSeries, to_ordinal
+from tracer import start_span
+
+COVERAGE_FILE = '_coverage.json'
+# IDs become directory names, so anything but plain identifiers is rejected
+_PARTITION_VALUE = re.compile(r'^[A-Za-z0-9_-]+$')
+# date32 stores days since 1970-01-01; MetricSeries stores proleptic ordinals
+_UNIX_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+_arrow = None
+
+
+def _import_arrow():
+    global _arrow
+    if _arrow is None:
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise RuntimeError("WAREHOUSE_PATH is set but pyarrow is not installed; "
+                               "pip install -r requirements-warehouse.txt") from None
+        _arrow = pyarrow
+    return _arrow
+
+
+def _month_starts(start_ordinal, end_ordinal):
+    """First day of every month overlapping the inclusive ordinal range"""
+    day = date.fromordinal(start_ordinal).replace(day=1)
+    last = date.fromordinal(end_ordinal)
+    while day <= last:
+        yield day
+        day = (day + timedelta(days=32)).replace(day=1)
+
+
+def _merge_ranges(ranges):
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def _write_atomic(path, write):
+    """Call write(tmp_path) then move the file into place, so readers never see a partial file"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.', suffix='.tmp')
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _write_bytes(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+class Warehouse:
+    """Parquet store of settled daily metrics, one file per customer/profile/month"""
+
+    def __init__(self, root, settle_days=3):
+        self.root = root
+        self.settle_days = settle_days
+        # Serializes read-modify-write of partitions and coverage within a process.
+        # Across processes the last writer wins, which at worst forgets a
+        # covered range and costs one more Sprout fetch.
+        self._lock = threading.Lock()
+        _import_arrow()
+
+    @staticmethod
+    def accepts(*ids):
+        """IDs become directory names, so only plain identifiers are stored"""
+        return all(_PARTITION_VALUE.match(str(value)) for value in ids)
+
+    def _profile_dir(self, customer_id, profile_id):
+        if not self.accepts(customer_id, profile_id):
+            raise ValueError(f"Invalid ID for the warehouse: {customer_id!r}/{profile_id!r}")
+        return os.path.join(self.root, f'customer_id={customer_id}', f'profile_id={profile_id}')
+
+    def _month_path(self, customer_id, profile_id, month):
+        return os.path.join(self._profile_dir(customer_id, profile_id), f'month={month:%Y-%m}', 'data.parquet')
+
+    def settled_until(self):
+        """Ordinal of the last day old enough to store"""
+        return date.today().toordinal() - self.settle_days
+
+    def _coverage(self, customer_id, profile_id):
+        try:
+            with open(os.path.join(self._profile_dir(customer_id, profile_id), COVERAGE_FILE), 'rb') as f:
+                return loads(f.read())
+        except FileNotFoundError:
+            return {'metrics': [], 'ranges': []}
+
+    def covers(self, customer_id, profile_id, start_date, end_date, metrics=PROFILE_METRICS):
+        """True when every day and metric of the range is stored locally"""
+        start, end = to_ordinal(start_date), to_ordinal(end_date)
+        coverage = self._coverage(customer_id, profile_id)
+        if not set(metrics) <= set(coverage['metrics']):
+            return False
+        return any(first <= start and end <= last for first, last in coverage['ranges'])
+
+    def _read_partition(self, path, metrics, start=None, end=None):
+        pa = _arrow
+        filters = None
+        if start is not None:
+            filters = [('day', '>=', date.fromordinal(start)), ('day', '<=', date.fromordinal(end))]
+        table = pa.parquet.read_table(path, columns=['day', *metrics], filters=filters)
+        days = table.column('day').cast(pa.int32()).to_numpy() + _UNIX_EPOCH_ORDINAL
+        return days, {metric: table.column(metric).to_numpy() for metric in metrics}
+
+    def read(self, customer_id, profile_id, start_date, end_date, metrics=PROFILE_METRICS):
+        """Stored days of the range as a MetricSeries, reading only the partitions it spans"""
+        start, end = to_ordinal(start_date), to_ordinal(end_date)
+        parts = []
+        with start_span('warehouse.read', **{'warehouse.profile_id': str(profile_id)}) as span:
+            for month in _month_starts(start, end):
+                path = self._month_path(customer_id, profile_id, month)
+                if os.path.exists(path):
+                    days, columns = self._read_partition(path, metrics, start, end)
+                    parts.append(MetricSeries(profile_id, days, columns))
+            if span is not None:
+                span.set_attribute('warehouse.partitions', len(parts))
+        if not parts:
+            return MetricSeries.empty(profile_id, metrics)
+        return MetricSeries.concat(parts)
+
+    def _write_partition(self, path, series, start, end):
+        """Replace the partition's days from the start to the end ordinal with series"""
+        pa = _arrow
+        if os.path.exists(path) and set(series.metrics) <= set(pa.parquet.read_schema(path).names):
+            # Keep stored days outside the fetched range; inside it the new fetch is authoritative
+            existing = MetricSeries(series.profile_id, *self._read_partition(path, series.metrics))
+            keep = (existing.days < start) | (existing.days > end)
+            series = MetricSeries.concat([
+                MetricSeries(series.profile_id, existing.days[keep],
+                             {metric: column[keep] for metric, column in existing.columns.items()}),
+                series
+            ])
+        table = pa.table({
+            'day': pa.array(series.days - _UNIX_EPOCH_ORDINAL, type=pa.int32()).cast(pa.date32()),
+            **{metric: pa.array(column) for metric, column in series.columns.items()}
+        })
+        _write_atomic(path, lambda tmp_path: pa.parquet.write_table(table, tmp_path, compression='zstd'))
+
+    def write(self, customer_id, series, start_date, end_date):
+        """
+        Store the settled part of a series fetched for start_date..end_date and
+        mark that range as covered. Returns the number of days stored.
+        """
+        start = to_ordinal(start_date)
+        end = min(to_ordinal(end_date), self.settled_until())
+        if start > end:
+            return 0
+        profile_id = series.profile_id
+        stored = 0
+        with self._lock, start_span('warehouse.write', **{'warehouse.profile_id': str(profile_id)}):
+            for month in _month_starts(start, end):
+                month_start = max(start, month.toordinal())
+                month_end = min(end, (month + timedelta(days=32)).replace(day=1).toordinal() - 1)
+                part = series.between(date.fromordinal(month_start), date.fromordinal(month_end))
+                path = self._month_path(customer_id, profile_id, month)
+                if len(part) or os.path.exists(path):
+                    self._write_partition(path, part, month_start, month_end)
+                    stored += len(part)
+
+            coverage = self._coverage(customer_id, profile_id)
+            if set(coverage['metrics']) != set(series.metrics):
+                # Different metric columns: older ranges may lack some of them
+                coverage = {'metrics': series.metrics, 'ranges': []}
+            coverage['ranges'] = _merge_ranges(coverage['ranges'] + [[start, end]])
+            path = os.path.join(self._profile_dir(customer_id, profile_id), COVERAGE_FILE)
+            _write_atomic(path, lambda tmp_path: _write_bytes(tmp_path, dumps(coverage)))
+        return stored
+
+
+def create_warehouse():
+    """Warehouse at WAREHOUSE_PATH, or None when the warehouse is disabled"""
+    path = os.environ.get('WAREHOUSE_PATH')
+    if not path:
+        return None
+    return Warehouse(path, settle_days=int(os.environ.get('WAREHOUSE_SETTLE_DAYS', 3)))